@@ -1,11 +1,22 @@
 import streamlit as st
 import pandas as pd
-import io
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import plotly.figure_factory as ff
-from utils import process_data, get_download_data
+from utils import (process_data, get_session_dataset, memory_report, set_session_dataset,
+                   set_session_dataset_key)
+from export import download_section
+from profiling import profiled_page
+from data_store import (
+    upload_key,
+    load_reviews,
+    load_from_store,
+    save_to_store,
+    preview_upload,
+    store_preview,
+    stream_process
+)
 
 def calculate_review_stats(df):
     """计算评论类型的统计信息"""
@@ -107,87 +118,117 @@ def save_fig_to_html(fig, filename):
     return fig.to_html()
 
 def main():
-    st.set_page_config(
-        page_title="Amazon评论分析工具",
-        page_icon="📊",
-        layout="wide"
-    )
-
     st.title("Amazon评论分析工具 - 数据预处理")
     st.write("第一步：上传Excel文件进行数据预处理")
     
-    uploaded_file = st.file_uploader("选择Excel文件", type=['xlsx', 'xls'])
+    uploaded_file = st.file_uploader("选择Excel文件", type=['xlsx', 'xls', 'csv', 'parquet'])
+    
+    # 大文件逐块读取和处理，避免整体读入内存
+    stream_mode = st.checkbox("大文件流式处理", help="逐块读取并处理文件，内存占用与文件大小无关")
     
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file)
-            
-            # 显示原始数据信息
-            st.subheader("原始数据信息")
-            st.write(f"总行数: {len(df)}")
-            st.write(f"总列数: {len(df.columns)}")
-            st.write("原始列名:", list(df.columns))
-            st.write("原始数据预览：")
-            st.dataframe(df.head())
+            if stream_mode:
+                df = None
+                preview_df = preview_upload(uploaded_file)
+                
+                # 显示原始数据信息
+                st.subheader("原始数据信息")
+                st.write(f"总列数: {len(preview_df.columns)}")
+                st.write("原始列名:", list(preview_df.columns))
+                st.write("原始数据预览：")
+                st.dataframe(preview_df)
+            else:
+                df = load_reviews(uploaded_file, processed=False)
+                
+                # 显示原始数据信息
+                st.subheader("原始数据信息")
+                st.write(f"总行数: {len(df)}")
+                st.write(f"总列数: {len(df.columns)}")
+                st.write("原始列名:", list(df.columns))
+                st.write("原始数据预览：")
+                st.dataframe(df.head())
             
+            # 同一文件的处理结果只计算一次
+            output_key = upload_key(uploaded_file, 'output')
             if st.button("数据处理"):
-                processed_df = process_data(df)
-                if processed_df is not None:
-                    st.session_state.processed_df = processed_df
-                    
-                    st.subheader("处理后的数据信息")
+                if stream_mode:
+                    # 流式处理只写入缓存文件，不把整个结果读回内存
+                    processed = store_preview(output_key) is not None
+                    if not processed:
+                        progress_bar = st.progress(0.0, text="正在逐块处理数据...")
+                        processed = stream_process(
+                            uploaded_file, output_key, process_data,
+                            on_progress=progress_bar.progress
+                        ) is not None
+                    if processed:
+                        # 分析页面直接使用处理结果，无需重新上传
+                        set_session_dataset_key(output_key)
+                else:
+                    processed_df = load_from_store(output_key)
+                    if processed_df is None:
+                        processed_df = process_data(df)
+                        if processed_df is not None:
+                            save_to_store(processed_df, output_key)
+                            processed_df = load_from_store(output_key)
+                    if processed_df is not None:
+                        set_session_dataset(processed_df)
+            
+            # 处理结果记录在会话中，选择下载选项导致的重跑不会丢失
+            if st.session_state.get('dataset_key') == output_key:
+                
+                st.subheader("处理后的数据信息")
+                if stream_mode:
+                    # 只读取Parquet元数据和开头几行，内存占用与文件大小无关
+                    n_rows, preview_df = store_preview(output_key, n_rows=100)
+                    st.write(f"处理后行数: {n_rows}")
+                    st.write(f"处理后列数: {len(preview_df.columns)}")
+                    st.write("处理后列名:", list(preview_df.columns))
+                    st.write(f"处理后的数据预览（前{len(preview_df)}行）：")
+                    st.dataframe(preview_df)
+                else:
+                    processed_df = get_session_dataset()
                     st.write(f"处理后行数: {len(processed_df)}")
                     st.write(f"处理后列数: {len(processed_df.columns)}")
                     st.write("处理后列名:", list(processed_df.columns))
                     st.write("处理后的数据预览：")
                     st.dataframe(processed_df)
                     
-                    # 下载处理后的数据
-                    st.subheader("下载处理后的数据")
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        # 选择评论类型
-                        review_type = st.selectbox(
-                            "选择要下载的评论类型",
-                            ["全部评论", "positive", "neutral", "negative"]
-                        )
-                    
-                    with col2:
-                        # 选择下载格式
-                        file_format = st.radio("选择下载格式", ["Excel", "TXT"])
-                    
-                    # 根据选择筛选数据
+                    with st.expander("内存占用报告"):
+                        report = memory_report(processed_df)
+                        st.write(f"总内存占用: {report['内存(MB)'].sum():.2f} MB")
+                        st.dataframe(report)
+                
+                # 下载处理后的数据
+                st.subheader("下载处理后的数据")
+                
+                # 选择评论类型
+                review_type = st.selectbox(
+                    "选择要下载的评论类型",
+                    ["全部评论", "positive", "neutral", "negative"]
+                )
+                
+                # 根据选择筛选数据，点击"准备下载文件"后才读取
+                def download_df():
+                    data = get_session_dataset()
                     if review_type != "全部评论":
-                        download_df = processed_df[
-                            processed_df['Review Type'] == review_type.lower()
-                        ]
-                    else:
-                        download_df = processed_df
-                    
-                    # 准备下载按钮
-                    if file_format == "Excel":
-                        file_data = get_download_data(download_df, 'excel')
-                        st.download_button(
-                            label="下载Excel文件",
-                            data=file_data,
-                            file_name=f"amazon_reviews_{review_type.lower()}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                    else:
-                        file_data = get_download_data(download_df, 'txt')
-                        st.download_button(
-                            label="下载TXT文件",
-                            data=file_data,
-                            file_name=f"amazon_reviews_{review_type.lower()}.txt",
-                            mime="text/plain"
-                        )
-                    
-                    st.success('数据处理完成！请点击左侧边栏的"统计分析"进行下一步分析。')
+                        data = data[data['Review Type'] == review_type.lower()]
+                    return data
+                
+                # 点击后才生成下载文件，结果按数据和评论类型缓存
+                download_section(download_df, output_key, review_type,
+                                 f"amazon_reviews_{review_type.lower()}", key="processed")
+                
+                st.success('数据处理完成！请点击左侧边栏的"统计分析"进行下一步分析，无需重新上传文件。')
                             
         except Exception as e:
             st.error(f"处理文件时出错: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    st.set_page_config(
+        page_title="Amazon评论分析工具",
+        page_icon="📊",
+        layout="wide"
+    )
+    with profiled_page("数据预处理"):
+        main() 
\ No newline at end of file
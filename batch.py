@@ -0,0 +1,219 @@
+"""批量处理命令行工具：对目录中的多个导出文件执行预处理、统计分析、词频统计和关键词分类
+
+不需要启动Streamlit，多个文件由进程池并行处理。每个输入文件在输出目录下生成一个以文件名
+（含扩展名）命名的子目录，不同目录中的同名文件依次加上-2、-3等后缀，汇总结果写入batch_summary.csv。
+
+运行方式（在仓库根目录）：
+    python batch.py 输入目录 输出目录 --workers 4 --format parquet --categories categories.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from data_store import read_upload
+from export import to_excel_bytes
+from rollup import build_rating_cube, rating_trend, rollup_cube
+from text_utils import (
+    TEXT_WORKERS,
+    compile_category_patterns,
+    count_ngrams,
+    load_negative_words,
+    load_stop_words,
+    match_categories
+)
+from utils import aggregate_by_group, calculate_review_stats, process_data
+
+# 支持的输入文件扩展名
+INPUT_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.parquet')
+
+# 预处理需要的列
+REQUIRED_COLUMNS = ['Asin', 'Title', 'Content', 'Model', 'Rating', 'Date']
+
+# 词频统计的评论类型
+WORD_FREQ_TYPES = ['all', 'positive', 'neutral', 'negative']
+
+
+def find_inputs(paths):
+    """展开输入路径，目录中按文件名排序取出所有支持的文件，重复指定的文件只保留一次"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(INPUT_EXTENSIONS) and not name.startswith('~$')
+            )
+        else:
+            files.append(path)
+    seen = set()
+    unique = []
+    for path in files:
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            unique.append(path)
+    return unique
+
+
+def output_names(files):
+    """每个输入文件的输出子目录名：保留扩展名（a.xlsx和a.csv不冲突），同名文件依次加-2、-3等后缀"""
+    names = []
+    used = set()
+    for path in files:
+        base = os.path.basename(path)
+        name = base
+        suffix = 2
+        while name.lower() in used:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def load_categories(path):
+    """读取关键词类别文件，不存在时返回空字典"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def word_frequencies(df, exclude, top_n):
+    """统计各评论类型出现最多的top_n个词"""
+    review_types = df['Review Type'].astype(str).str.lower()
+    tables = []
+    for review_type in WORD_FREQ_TYPES:
+        texts = df['Content'] if review_type == 'all' else df.loc[review_types == review_type, 'Content']
+        counts = count_ngrams(texts, n=1, exclude=exclude, min_length=3, min_count=1, max_entries=None)
+        table = pd.DataFrame(counts.most_common(top_n), columns=['Word', 'Frequency'])
+        table.insert(0, 'Review Type', review_type)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def keyword_results(df, categories):
+    """关键词分类：返回(每条评论的匹配结果, 各类别的匹配统计)"""
+    matches = match_categories(df['Content'], compile_category_patterns(categories))
+    matches.columns = [f'Is {category}' for category in categories]
+    matches.insert(0, 'ID', df['ID'].to_numpy())
+    matched = matches.drop(columns='ID').sum()
+    stats = pd.DataFrame({
+        '类别': list(categories),
+        '匹配数量': matched.to_numpy(),
+        '匹配比例(%)': (matched / max(len(df), 1) * 100).round(2).to_numpy()
+    })
+    return matches, stats
+
+
+def analyze_file(path, output_dir, name, options):
+    """处理一个文件并将全部结果写入output_dir下的name子目录，返回汇总信息"""
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        raw = read_upload(f)
+    missing = [col for col in REQUIRED_COLUMNS if col not in raw.columns]
+    if missing:
+        raise ValueError(f"缺少必要的列: {', '.join(missing)}")
+    processed = process_data(raw)
+
+    asin_stats, rating_dist = aggregate_by_group(processed)
+    asin_stats['评论类型分布'] = asin_stats['评论类型分布'].map(lambda x: json.dumps(x, ensure_ascii=False))
+    review_stats, _, _ = calculate_review_stats(processed)
+    cube = rollup_cube(build_rating_cube(processed), 'M')
+    tables = {
+        'review_stats': review_stats.rename_axis('Review Type').reset_index(),
+        'asin_stats': asin_stats.reset_index(),
+        'rating_distribution': rating_dist.rename(columns=str).reset_index(),
+        'monthly_trend': rating_trend(cube, by='Asin'),
+        'word_freq': word_frequencies(processed, options['exclude'], options['top_words']),
+    }
+    if options['categories']:
+        tables['keyword_matches'], tables['keyword_stats'] = keyword_results(processed, options['categories'])
+
+    target = os.path.join(output_dir, name)
+    os.makedirs(target, exist_ok=True)
+    if options['format'] == 'excel':
+        with open(os.path.join(target, 'processed.xlsx'), 'wb') as f:
+            f.write(to_excel_bytes(processed))
+        with pd.ExcelWriter(os.path.join(target, 'analysis.xlsx'), engine='xlsxwriter') as writer:
+            for sheet, table in tables.items():
+                table.to_excel(writer, sheet_name=sheet, index=False)
+    else:
+        processed.to_parquet(os.path.join(target, 'processed.parquet'), engine='pyarrow', index=False)
+        for table_name, table in tables.items():
+            table.to_parquet(os.path.join(target, f'{table_name}.parquet'), engine='pyarrow', index=False)
+
+    return {'rows': len(processed), 'asins': len(asin_stats), 'seconds': round(time.perf_counter() - start, 2)}
+
+
+def _run_file(path, output_dir, name, options):
+    """进程池中执行的任务，出错时返回错误信息而不是中断整个批次"""
+    try:
+        return {'file': path, 'output': name, 'status': 'ok', **analyze_file(path, output_dir, name, options)}
+    except Exception as e:
+        return {'file': path, 'output': name, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_batch(paths, output_dir, workers=TEXT_WORKERS, file_format='parquet',
+              categories_path='categories.json', top_words=100):
+    """并行处理所有输入文件，返回汇总DataFrame并写入batch_summary.csv"""
+    files = find_inputs(paths)
+    names = output_names(files)
+    options = {
+        'format': file_format,
+        'categories': load_categories(categories_path),
+        'exclude': tuple(sorted(load_stop_words() | load_negative_words())),
+        'top_words': top_words,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    if workers <= 1 or len(files) <= 1:
+        for path, name in zip(files, names):
+            results.append(_run_file(path, output_dir, name, options))
+            print(_format_result(results[-1], len(results), len(files)), flush=True)
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(files)), mp_context=context) as executor:
+            futures = [executor.submit(_run_file, path, output_dir, name, options) for path, name in zip(files, names)]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print(_format_result(results[-1], len(results), len(files)), flush=True)
+
+    summary = pd.DataFrame(results, columns=['file', 'output', 'status', 'rows', 'asins', 'seconds', 'error'])
+    summary = summary.sort_values('file', kind='stable').reset_index(drop=True)
+    summary[['rows', 'asins']] = summary[['rows', 'asins']].astype('Int64')
+    summary.to_csv(os.path.join(output_dir, 'batch_summary.csv'), index=False, encoding='utf-8-sig')
+    return summary
+
+
+def _format_result(result, done, total):
+    if result['status'] == 'ok':
+        return f"[{done}/{total}] {result['file']}: {result['rows']}行, {result['seconds']}s"
+    return f"[{done}/{total}] {result['file']}: 失败 {result['error']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量预处理和分析Amazon评论导出文件")
+    parser.add_argument('inputs', nargs='+', help="输入文件或目录（支持xlsx、xls、csv、parquet）")
+    parser.add_argument('output', help="输出目录")
+    parser.add_argument('--workers', type=int, default=TEXT_WORKERS, help="并行进程数，默认使用全部CPU")
+    parser.add_argument('--format', choices=['parquet', 'excel'], default='parquet', help="输出格式")
+    parser.add_argument('--categories', default='categories.json', help="关键词类别文件，不存在时跳过关键词分类")
+    parser.add_argument('--top-words', type=int, default=100, help="每种评论类型输出的高频词数量")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.inputs, args.output, workers=args.workers, file_format=args.format,
+                        categories_path=args.categories, top_words=args.top_words)
+    failed = (summary['status'] != 'ok').sum()
+    print(f"完成：{len(summary) - failed}个成功，{failed}个失败，汇总见{os.path.join(args.output, 'batch_summary.csv')}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
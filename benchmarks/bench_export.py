@@ -0,0 +1,55 @@
+"""文本导出基准测试：对比df.to_string与逐块写出的TXT/TSV/JSONL
+
+记录耗时、Python分配的内存峰值和输出大小。
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_export 10000 50000
+"""
+import io
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_reviews
+from export import write_text_export
+from utils import process_data
+
+
+def measure(func):
+    """返回(耗时, 内存峰值MB, 输出字节数)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, size
+
+
+def legacy_txt(df):
+    """原实现：按最宽单元格补齐列宽后生成一个字符串"""
+    return len(df.to_string(index=False).encode('utf-8'))
+
+
+def streaming(df, file_format):
+    output = io.BytesIO()
+    write_text_export(df, file_format, output)
+    return output.tell()
+
+
+def main(sizes):
+    print(f"{'rows':>8} {'method':>12} {'seconds':>9} {'peak MB':>9} {'output MB':>10}")
+    for n_rows in sizes:
+        # 评论长度差异大时to_string的补齐开销最明显
+        df = process_data(generate_reviews(n_rows, text_words=80))
+        cases = [('to_string', lambda: legacy_txt(df))] + [
+            (file_format, lambda file_format=file_format: streaming(df, file_format))
+            for file_format in ('TXT', 'TSV', 'JSONL')
+        ]
+        for name, func in cases:
+            elapsed, peak, size = measure(func)
+            print(f"{n_rows:>8} {name:>12} {elapsed:>9.2f} {peak:>9.1f} {size / 2 ** 20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000])
@@ -0,0 +1,50 @@
+"""分组统计基准测试：对比逐组lambda聚合与单次遍历的bincount聚合
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_group_stats 300000 3000
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_reviews
+from utils import aggregate_by_group, process_data
+
+
+def legacy_group_stats(df):
+    """原实现：agg中对每个分组调用value_counts，再单独groupby计算评分分布"""
+    stats = df.groupby('Asin', observed=True).agg({
+        'Rating': ['count', 'mean', 'std'],
+        'Review Type': lambda x: x.value_counts().to_dict()
+    }).round(2)
+    stats.columns = ['评论数量', '平均评分', '标准差', '评论类型分布']
+    rating_dist = df.groupby(['Asin', 'Rating'], observed=True).size().unstack(fill_value=0)
+    return stats, rating_dist
+
+
+def main(n_rows, n_asins):
+    df = process_data(generate_reviews(n_rows, n_asins=n_asins, text_words=5))
+
+    start = time.perf_counter()
+    expected, expected_dist = legacy_group_stats(df)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual, actual_dist = aggregate_by_group(df)
+    single_pass_time = time.perf_counter() - start
+
+    assert (expected['评论数量'].values == actual['评论数量'].values).all()
+    # 原实现在float32上求均值，四舍五入边界处可能相差0.01
+    assert np.allclose(expected['平均评分'], actual['平均评分'], atol=0.011)
+    assert (expected_dist.values == actual_dist.values).all()
+    assert all({k: v for k, v in x.items() if v} == y
+               for x, y in zip(expected['评论类型分布'], actual['评论类型分布']))
+    print(f"rows={n_rows} asins={n_asins}")
+    print(f"legacy:      {legacy_time:.3f}s")
+    print(f"single pass: {single_pass_time:.3f}s ({legacy_time / single_pass_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [300000, 3000][len(args):]))
@@ -0,0 +1,57 @@
+"""高频词统计基准测试：对比精确Counter与Space-Saving近似统计的结果和内存
+
+评论中混入随机的型号、拼写错误等一次性词语，使词表随数据量增长。
+检查近似统计的前K个词与精确结果一致，且每个计数都在误差范围内。
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_heavy_hitters 100000 5000
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_reviews
+from text_utils import SpaceSaving, _iter_ngram_counts, count_ngrams
+
+
+def add_noise_tokens(texts, seed=0):
+    """每条评论追加一个随机的SKU式词语，模拟不断增长的长尾词表"""
+    rng = np.random.default_rng(seed)
+    skus = pd.Series(rng.integers(0, 36 ** 8, size=len(texts))).map(lambda x: np.base_repr(x, 36).lower())
+    return texts.str.cat(skus.values, sep=' sku')
+
+
+def main(n_rows, capacity, top_k=100):
+    texts = add_noise_tokens(generate_reviews(n_rows, text_words=40)['Content'])
+
+    start = time.perf_counter()
+    exact = count_ngrams(texts, n=1, min_length=3, min_count=1, max_entries=None)
+    exact_time = time.perf_counter() - start
+
+    # 与count_ngrams相同的流程，保留SpaceSaving以检查误差上界
+    start = time.perf_counter()
+    summary = SpaceSaving(capacity)
+    for phrases, counts in _iter_ngram_counts(texts, 1, (), 3, 50000, 1):
+        summary.update(phrases, counts)
+    approx = summary.to_counter()
+    approx_time = time.perf_counter() - start
+
+    exact_top = [word for word, _ in exact.most_common(top_k)]
+    approx_top = [word for word, _ in summary.top(top_k)]
+    recall = len(set(exact_top) & set(approx_top)) / top_k
+    for word, count in summary.counts.items():
+        # 计数是真实次数的上界，高估不超过记录的误差
+        assert exact[word] <= count <= exact[word] + summary.errors[word], word
+    assert all(exact[word] <= summary.floor for word in exact if word not in summary.counts)
+
+    print(f"rows={n_rows} vocabulary={len(exact)} capacity={capacity}")
+    print(f"exact:  {exact_time:.3f}s, {len(exact)} counters")
+    print(f"approx: {approx_time:.3f}s, {len(approx)} counters, max error={summary.floor}")
+    print(f"top-{top_k} recall: {recall:.2%}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [100000, 5000][len(args):]))
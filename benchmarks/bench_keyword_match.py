@@ -0,0 +1,62 @@
+"""关键词匹配基准测试：对比逐行逐关键词扫描与合并正则匹配
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_keyword_match 100000 300
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_reviews, make_vocabulary
+from text_utils import compile_category_patterns, match_categories
+
+
+def legacy_match(texts, categories):
+    """原实现：每行、每个类别、每个关键词做一次子串判断"""
+    def match_keywords(text, keywords):
+        if pd.isna(text):
+            return False
+        text = str(text).lower()
+        return any(keyword.lower().strip() in text for keyword in keywords)
+
+    matrix = {}
+    for category in categories:
+        keywords = [k.strip() for k in categories[category].split(',') if k.strip()]
+        matrix[category] = texts.apply(lambda x: match_keywords(x, keywords))
+    return pd.DataFrame(matrix)
+
+
+def make_categories(n_keywords, n_categories=10, seed=0):
+    """从词表中抽取关键词组成类别"""
+    rng = np.random.default_rng(seed)
+    vocab = make_vocabulary(5000, seed)
+    words = rng.choice(vocab[100:], size=n_keywords, replace=False)
+    return {
+        f"category_{i}": ','.join(group)
+        for i, group in enumerate(np.array_split(words, n_categories))
+    }
+
+
+def main(n_rows, n_keywords):
+    texts = generate_reviews(n_rows, text_words=40)['Content']
+    categories = make_categories(n_keywords)
+
+    start = time.perf_counter()
+    expected = legacy_match(texts, categories)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = match_categories(texts, compile_category_patterns(categories))
+    compiled_time = time.perf_counter() - start
+
+    assert (expected.values == actual.values).all(), "匹配结果不一致"
+    print(f"rows={n_rows} keywords={n_keywords}")
+    print(f"legacy:   {legacy_time:.3f}s")
+    print(f"compiled: {compiled_time:.3f}s ({legacy_time / compiled_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [100000, 300][len(args):]))
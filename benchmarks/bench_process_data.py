@@ -0,0 +1,24 @@
+"""process_data基准测试：验证预处理耗时随行数线性增长
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_process_data 10000 100000 1000000
+"""
+import sys
+import time
+
+from benchmarks.synthetic import generate_reviews
+from utils import process_data
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>10}")
+    for n_rows in sizes:
+        raw = generate_reviews(n_rows, text_words=20)
+        start = time.perf_counter()
+        process_data(raw)
+        elapsed = time.perf_counter() - start
+        print(f"{n_rows:>10} {elapsed:>10.3f} {elapsed / n_rows * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,54 @@
+"""多进程文本处理基准测试：分词和关键词匹配在不同进程数下的耗时和加速比
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.bench_text_parallel 400000 1 2 4 8 16
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_keyword_match import make_categories
+from benchmarks.synthetic import generate_reviews
+from text_utils import compile_category_patterns, match_texts, tokenize_batch
+
+
+def timed(func, *args):
+    """执行函数并返回(结果, 耗时)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(n_rows, worker_counts):
+    texts = generate_reviews(n_rows, text_words=40)['Content']
+    patterns = compile_category_patterns(make_categories(300))
+
+    base_tokens, base_matches = None, None
+    base_times = None
+    print(f"rows={n_rows}")
+    print(f"{'workers':>8} {'tokenize':>10} {'speedup':>8} {'match':>10} {'speedup':>8}")
+    for workers in worker_counts:
+        # 先完整运行一次预热进程池，避免把进程启动时间计入
+        tokenize_batch(texts, workers)
+        tokens, tokenize_time = timed(tokenize_batch, texts, workers)
+        matches, match_time = timed(match_texts, texts, patterns, workers)
+
+        if base_times is None:
+            base_tokens, base_matches = tokens, matches
+            base_times = (tokenize_time, match_time)
+        else:
+            # 分片并行的结果必须与单进程一致
+            rows, codes, terms = tokens
+            base_rows, base_codes, base_terms = base_tokens
+            assert np.array_equal(rows, base_rows)
+            assert np.array_equal(terms[codes], base_terms[base_codes])
+            assert all(np.array_equal(matches[c], base_matches[c]) for c in patterns)
+
+        print(f"{workers:>8} {tokenize_time:>10.3f} {base_times[0] / tokenize_time:>8.2f}"
+              f" {match_time:>10.3f} {base_times[1] / match_time:>8.2f}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 400000, args[1:] or [1, 2, 4, 8])
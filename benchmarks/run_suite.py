@@ -0,0 +1,181 @@
+"""基准测试套件：在合成数据上测量各热点路径的耗时和内存峰值，并与保存的基线比较
+
+覆盖预处理、分组统计、趋势图、词频统计、关键词匹配和下载文件生成。
+耗时和内存分两次运行测量（tracemalloc会明显拖慢运行速度）；内存为Python和numpy分配的峰值，
+不包括Arrow内存池。
+
+运行方式（在仓库根目录）：
+    python -m benchmarks.run_suite                          # 10k/100k/1M行，与基线比较
+    python -m benchmarks.run_suite --sizes 10000 100000 --save
+    python -m benchmarks.run_suite --only process_data analyze_by_group
+耗时超过基线(1 + tolerance)倍的项标记为REGRESSION，此时退出码为1。
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_keyword_match import make_categories
+from benchmarks.synthetic import generate_reviews
+from rollup import build_rating_cube, rating_trend, rollup_cube
+from text_utils import TokenIndex, compile_category_patterns, load_stop_words, match_categories
+from utils import (
+    MAX_TREND_GROUPS,
+    analyze_by_group,
+    create_rating_trend_chart,
+    get_download_data,
+    process_data
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+def bench_process_data(data):
+    process_data(data['raw'])
+
+
+def bench_analyze_by_group(data):
+    analyze_by_group(data['df'], ['Asin', 'Model'])
+
+
+def bench_rating_trend_chart(data):
+    """与统计页面相同：构建汇总立方体，按月汇总后绘制前N个Asin的趋势"""
+    cube = rollup_cube(build_rating_cube(data['df']), 'M')
+    create_rating_trend_chart(rating_trend(cube, by='Asin', top_n=MAX_TREND_GROUPS), 'Asin')
+
+
+def bench_word_freq(data):
+    """与词云页面相同：建立倒排索引后汇总词频并过滤停用词"""
+    index = TokenIndex.build(data['df']['Content'])
+    index.to_counter(index.term_totals(), index.term_mask(data['stop_words'], min_length=3))
+
+
+def bench_keyword_match(data):
+    match_categories(data['df']['Content'], data['patterns'])
+
+
+def bench_download_excel(data):
+    get_download_data(data['df'], 'excel')
+
+
+def bench_download_txt(data):
+    get_download_data(data['df'], 'txt')
+
+
+BENCHMARKS = {
+    'process_data': bench_process_data,
+    'analyze_by_group': bench_analyze_by_group,
+    'rating_trend_chart': bench_rating_trend_chart,
+    'word_freq': bench_word_freq,
+    'keyword_match': bench_keyword_match,
+    'download_excel': bench_download_excel,
+    'download_txt': bench_download_txt,
+}
+
+
+def prepare(n_rows, args):
+    """生成合成数据并完成预处理，这部分不计入耗时"""
+    raw = generate_reviews(n_rows, n_asins=args.asins, n_models=args.models,
+                           text_words=args.text_words, vocab_size=args.vocab, seed=args.seed)
+    return {
+        'raw': raw,
+        'df': process_data(raw),
+        'stop_words': tuple(sorted(load_stop_words())),
+        'patterns': compile_category_patterns(make_categories(300, seed=args.seed)),
+    }
+
+
+def measure(func, data, memory=True):
+    """返回(耗时秒数, 内存峰值MB)，memory为False时内存为None"""
+    gc.collect()
+    start = time.perf_counter()
+    func(data)
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func(data)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def load_baselines(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(baselines, path=BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, baseline, tolerance):
+    """与基线比较，返回显示文本和是否退化"""
+    if not baseline:
+        return '', False
+    ratio = result['seconds'] / baseline['seconds'] if baseline['seconds'] else 1.0
+    regressed = ratio > 1 + tolerance
+    return f"{ratio:>6.2f}x{' REGRESSION' if regressed else ''}", regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在合成数据上运行基准测试并与基线比较")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help="数据行数")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="只运行指定的测试")
+    parser.add_argument('--asins', type=int, default=50, help="ASIN数量")
+    parser.add_argument('--models', type=int, default=5, help="每个ASIN的Model数量")
+    parser.add_argument('--text-words', type=int, default=40, help="每条评论的平均词数")
+    parser.add_argument('--vocab', type=int, default=5000, help="词表大小")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--no-memory', action='store_true', help="不测量内存，只测耗时")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="耗时超过基线多少比例视为退化")
+    parser.add_argument('--save', action='store_true', help="将本次结果保存为基线")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="基线文件路径")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baseline)
+    names = args.only or list(BENCHMARKS)
+    regressions = []
+    # 预热：先在少量数据上运行一遍，避免把首次导入和初始化计入耗时
+    warmup = prepare(1000, args)
+    for name in names:
+        BENCHMARKS[name](warmup)
+    del warmup
+
+    print(f"{'rows':>8} {'benchmark':<20} {'seconds':>9} {'peak MB':>9} {'vs baseline':>12}")
+    for n_rows in args.sizes:
+        data = prepare(n_rows, args)
+        for name in names:
+            seconds, peak_mb = measure(BENCHMARKS[name], data, memory=not args.no_memory)
+            result = {'seconds': round(seconds, 4)}
+            if peak_mb is not None:
+                result['peak_mb'] = round(peak_mb, 1)
+            baseline = baselines.get(str(n_rows), {}).get(name)
+            text, regressed = compare(result, baseline, args.tolerance)
+            if regressed:
+                regressions.append((n_rows, name))
+            peak_text = f"{peak_mb:>9.1f}" if peak_mb is not None else f"{'-':>9}"
+            print(f"{n_rows:>8} {name:<20} {seconds:>9.3f} {peak_text} {text:>12}", flush=True)
+            if args.save:
+                baselines.setdefault(str(n_rows), {})[name] = result
+        del data
+
+    if args.save:
+        save_baselines(baselines, args.baseline)
+        print(f"基线已保存到{args.baseline}")
+    if regressions:
+        print("性能退化：" + ", ".join(f"{name}@{n_rows}" for n_rows, name in regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
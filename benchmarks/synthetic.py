@@ -0,0 +1,51 @@
+"""合成Amazon评论数据生成器，用于基准测试"""
+import numpy as np
+import pandas as pd
+
+# 评论中常见的词，保证词频分布接近真实评论
+COMMON_WORDS = [
+    'great', 'good', 'quality', 'size', 'fit', 'small', 'large', 'love',
+    'comfortable', 'color', 'battery', 'life', 'broke', 'cheap', 'perfect',
+    'women', 'woman', 'runs', 'soft', 'material', 'disappointed', 'easy',
+]
+
+
+def make_vocabulary(vocab_size, seed=0):
+    """生成指定大小的词表"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    extra = max(vocab_size - len(COMMON_WORDS), 0)
+    lengths = rng.integers(3, 10, size=extra)
+    words = [''.join(rng.choice(letters, size=n)) for n in lengths]
+    return np.array(COMMON_WORDS[:vocab_size] + words, dtype=object)
+
+
+def generate_reviews(n_rows, n_asins=50, n_models=5, text_words=40,
+                     vocab_size=5000, seed=0):
+    """生成与Shulex导出格式一致的原始评论数据"""
+    rng = np.random.default_rng(seed)
+    vocab = make_vocabulary(vocab_size, seed)
+
+    # Zipf分布的词频，少数词出现频繁
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(max(text_words // 2, 1), text_words * 3 // 2 + 1, size=n_rows)
+    tokens = rng.choice(vocab, size=int(lengths.sum()), p=weights)
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    content = [' '.join(tokens[bounds[i]:bounds[i + 1]]) for i in range(n_rows)]
+    title = [' '.join(tokens[bounds[i]:bounds[i] + 4]) for i in range(n_rows)]
+
+    asins = np.array([f"B0{i:08d}" for i in range(n_asins)], dtype=object)
+    models = np.array([f"Model-{i}" for i in range(n_models)], dtype=object)
+    start = np.datetime64('2020-01-01')
+    days = rng.integers(0, 5 * 365, size=n_rows)
+
+    return pd.DataFrame({
+        'Asin': rng.choice(asins, size=n_rows),
+        'Title': title,
+        'Content': content,
+        'Model': rng.choice(models, size=n_rows),
+        'Rating': rng.choice([1, 2, 3, 4, 5], size=n_rows, p=[0.1, 0.05, 0.1, 0.2, 0.55]),
+        'Date': (start + days.astype('timedelta64[D]')).astype(str),
+        'Country': 'US',
+    })
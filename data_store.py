@@ -0,0 +1,435 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from profiling import instrument
+
+# Parquet缓存目录，按文件内容哈希命名
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.review_store')
+
+# 缓存格式版本：预处理逻辑或缓存文件格式变化时加一，旧版本的缓存文件不再使用并会被清理
+STORE_VERSION = 2
+
+# 缓存目录的磁盘占用上限（MB）和文件保留天数，可通过环境变量配置
+STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_MB', 2048)) * 2 ** 20
+STORE_MAX_AGE = float(os.environ.get('STORE_MAX_AGE_DAYS', 30)) * 86400
+
+# 写入失败遗留的临时文件超过该秒数后清理
+STALE_TEMP_AGE = 3600
+
+# 以分类类型存储的列
+CATEGORY_COLUMNS = ['Asin', 'Model', 'Review Type']
+
+# 读取缓存时文本列使用的类型：Arrow字符串数组，比Python字符串对象紧凑得多
+STRING_DTYPE = pd.StringDtype('pyarrow')
+
+# 流式读取时每块的行数
+CHUNK_SIZE = 50000
+
+# 进程内共享的数据集缓存的内存上限，可通过环境变量DATASET_CACHE_MB配置（单位MB）
+DATASET_CACHE_BYTES = int(os.environ.get('DATASET_CACHE_MB', 1024)) * 2 ** 20
+
+# 缓存键 -> (DataFrame, 占用字节数)，按最近使用排序；所有会话共享
+_DATASETS = OrderedDict()
+_DATASETS_LOCK = threading.Lock()
+_datasets_bytes = 0
+
+
+def content_hash(data):
+    """计算文件内容的哈希值"""
+    if hasattr(data, 'getbuffer'):
+        # 直接读取缓冲区，避免复制整个文件
+        data = data.getbuffer()
+    elif hasattr(data, 'getvalue'):
+        data = data.getvalue()
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_path(key, ext='parquet'):
+    """获取缓存文件路径"""
+    return os.path.join(STORE_DIR, f"{key}.{ext}")
+
+
+def upload_key(uploaded_file, kind):
+    """上传文件的缓存键：内容哈希 + 缓存格式版本 + 类型，派生结果（汇总立方体、倒排索引）以此为前缀"""
+    return f"{content_hash(uploaded_file)}-v{STORE_VERSION}-{kind}"
+
+
+def _touch(path):
+    """更新文件的修改时间，清理缓存时按修改时间判断是否最近使用"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def cleanup_store(keep=None, max_bytes=None, max_age=None):
+    """清理缓存目录，返回删除的文件数
+
+    删除旧版本的缓存文件、遗留的临时文件和超过max_age秒未使用的文件，
+    总大小仍超过max_bytes时从最久未使用的文件开始删除。keep为缓存键，
+    以它开头的文件（数据集及其派生结果）不会被删除。
+    """
+    max_bytes = STORE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = STORE_MAX_AGE if max_age is None else max_age
+    try:
+        entries = list(os.scandir(STORE_DIR))
+    except FileNotFoundError:
+        return 0
+
+    now = time.time()
+    version_tag = f"-v{STORE_VERSION}-"
+    files = []
+    removed = 0
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if not entry.is_file() or (keep is not None and entry.name.startswith(keep)):
+            continue
+        if entry.name.endswith(('.tmp', '.tmp.npz')):
+            expired = now - stat.st_mtime > STALE_TEMP_AGE
+        else:
+            expired = version_tag not in entry.name or now - stat.st_mtime > max_age
+        if expired:
+            removed += _remove_store_file(entry.path)
+        else:
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        removed += _remove_store_file(path)
+        total -= size
+    return removed
+
+
+def _remove_store_file(path):
+    """删除缓存文件，已被其他会话删除时忽略"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return 1
+
+
+def to_store_dtypes(df):
+    """转换为列式存储使用的数据类型"""
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).astype('category')
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    return df
+
+
+def _coerce_object_columns(df):
+    """将混合类型的object列转换为字符串，保证可以写入Parquet"""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    df.columns = [str(col) for col in df.columns]
+    return df
+
+
+def temp_path(path, suffix='.tmp'):
+    """在path所在目录创建唯一的临时文件，写完后用os.replace替换为path
+
+    Streamlit的各会话是同一进程中的线程，临时文件名不能只按进程号区分。
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=suffix,
+                                    dir=os.path.dirname(path))
+    os.close(fd)
+    return tmp_path
+
+
+def save_to_store(df, key):
+    """将DataFrame写入Parquet缓存"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = store_path(key)
+    tmp_path = temp_path(path)
+    try:
+        try:
+            df.to_parquet(tmp_path, engine='pyarrow', index=False)
+        except (TypeError, ValueError):
+            # pyarrow无法推断混合类型列时退化为字符串
+            _coerce_object_columns(df).to_parquet(tmp_path, engine='pyarrow', index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    forget_dataset(key)
+    cleanup_store(keep=key)
+    return path
+
+
+def dataframe_nbytes(df):
+    """DataFrame实际占用的内存（包括字符串对象）"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _pop_dataset(key):
+    """从共享缓存中移除数据集，调用方需持有_DATASETS_LOCK"""
+    global _datasets_bytes
+    if key in _DATASETS:
+        _datasets_bytes -= _DATASETS.pop(key)[1]
+
+
+def forget_dataset(key):
+    """缓存文件被重写后，移除共享缓存中的旧数据"""
+    with _DATASETS_LOCK:
+        _pop_dataset(key)
+
+
+def cache_dataset(key, df):
+    """放入进程内共享缓存，超出DATASET_CACHE_BYTES时淘汰最久未使用的数据集"""
+    global _datasets_bytes
+    nbytes = dataframe_nbytes(df)
+    with _DATASETS_LOCK:
+        _pop_dataset(key)
+        if nbytes > DATASET_CACHE_BYTES:
+            # 单个数据集超出上限时不缓存，下次从Parquet读取
+            return
+        _DATASETS[key] = (df, nbytes)
+        _datasets_bytes += nbytes
+        while _datasets_bytes > DATASET_CACHE_BYTES:
+            _, (_, evicted) = _DATASETS.popitem(last=False)
+            _datasets_bytes -= evicted
+
+
+def cached_dataset(key):
+    """从进程内共享缓存获取数据集，不存在时返回None"""
+    with _DATASETS_LOCK:
+        item = _DATASETS.get(key)
+        if item is None:
+            return None
+        _DATASETS.move_to_end(key)
+        return item[0]
+
+
+@instrument()
+def load_from_store(key):
+    """从Parquet缓存读取DataFrame，不存在时返回None，缓存键保存在df.attrs['store_key']中
+
+    读取结果放入进程内共享缓存，同一数据集在各页面、各会话之间只保留一份，
+    调用方不应修改返回的DataFrame。
+    """
+    path = store_path(key)
+    df = cached_dataset(key)
+    if df is not None:
+        _touch(path)
+        return df
+    if not os.path.exists(path):
+        return None
+    _touch(path)
+    # 文本列直接转换为Arrow字符串，不创建Python字符串对象；分类列按元数据恢复为分类类型
+    df = pq.read_table(path, memory_map=True).to_pandas(
+        types_mapper={pa.string(): STRING_DTYPE, pa.large_string(): STRING_DTYPE}.get
+    )
+    # 记录缓存键，供后续计算判断数据是否变化
+    df.attrs['store_key'] = key
+    cache_dataset(key, df)
+    return df
+
+
+def upload_format(uploaded_file):
+    """根据文件名判断上传文件格式"""
+    name = getattr(uploaded_file, 'name', '') or ''
+    ext = os.path.splitext(name)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext == '.parquet':
+        return 'parquet'
+    if ext == '.xls':
+        return 'xls'
+    return 'xlsx'
+
+
+@instrument()
+def read_upload(uploaded_file):
+    """一次性读取上传文件"""
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+    file_format = upload_format(uploaded_file)
+    if file_format == 'csv':
+        return pd.read_csv(uploaded_file)
+    if file_format == 'parquet':
+        return pd.read_parquet(uploaded_file, engine='pyarrow')
+    return pd.read_excel(uploaded_file)
+
+
+def _iter_excel_chunks(uploaded_file, chunk_size):
+    """使用openpyxl只读模式逐行读取Excel"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+        total = max((sheet.max_row or 0) - 1, 0)
+
+        buffer = []
+        done = 0
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                done += len(buffer)
+                yield pd.DataFrame(buffer, columns=header), min(done / total, 1.0) if total else None
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header), 1.0
+    finally:
+        workbook.close()
+
+
+def _iter_csv_chunks(uploaded_file, chunk_size):
+    """使用pandas分块读取CSV"""
+    size = len(uploaded_file.getbuffer()) if hasattr(uploaded_file, 'getbuffer') else 0
+    with pd.read_csv(uploaded_file, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            progress = min(uploaded_file.tell() / size, 1.0) if size else None
+            yield chunk, progress
+
+
+def _iter_parquet_chunks(uploaded_file, chunk_size):
+    """按批次读取Parquet"""
+    parquet_file = pq.ParquetFile(uploaded_file)
+    total = parquet_file.metadata.num_rows
+    done = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        done += batch.num_rows
+        yield batch.to_pandas(), min(done / total, 1.0) if total else None
+
+
+def iter_upload_chunks(uploaded_file, chunk_size=CHUNK_SIZE):
+    """逐块读取上传文件，返回(数据块, 进度)，无法估计进度时进度为None"""
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+    file_format = upload_format(uploaded_file)
+    if file_format == 'csv':
+        return _iter_csv_chunks(uploaded_file, chunk_size)
+    if file_format == 'parquet':
+        return _iter_parquet_chunks(uploaded_file, chunk_size)
+    if file_format == 'xls':
+        # xls不支持逐行读取，整体读入后再分块
+        df = read_upload(uploaded_file)
+        return ((df.iloc[i:i + chunk_size], min((i + chunk_size) / len(df), 1.0))
+                for i in range(0, len(df), chunk_size))
+    return _iter_excel_chunks(uploaded_file, chunk_size)
+
+
+def preview_upload(uploaded_file, n_rows=5):
+    """只读取文件开头的若干行用于预览"""
+    chunks = iter_upload_chunks(uploaded_file, chunk_size=n_rows)
+    try:
+        chunk, _ = next(chunks, (pd.DataFrame(), None))
+    finally:
+        chunks.close()
+    return chunk
+
+
+def _stream_table(df):
+    """转换为Arrow表，分类列统一为字典类型、评分统一为float32，保证各数据块schema一致"""
+    df = df.copy()
+    if 'Rating' in df.columns:
+        df['Rating'] = df['Rating'].astype(np.float32)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(
+                i, field.name, table.column(i).cast(pa.dictionary(pa.int32(), pa.string())))
+    return table
+
+
+@instrument()
+def stream_process(uploaded_file, key, process, chunk_size=CHUNK_SIZE, on_progress=None):
+    """流式预处理：逐块调用process并增量写入Parquet缓存
+
+    process接收(数据块, 起始ID)，返回处理后的数据块或None。
+    内存占用只与chunk_size有关，与文件大小无关；返回写入的行数，不读回整个结果，失败时返回None。
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = store_path(key)
+    tmp_path = temp_path(path)
+    writer = None
+    n_rows = 0
+    completed = False
+    chunks = iter_upload_chunks(uploaded_file, chunk_size)
+    try:
+        for chunk, progress in chunks:
+            processed = process(chunk, id_start=n_rows + 1)
+            if processed is None:
+                return None
+            table = _stream_table(processed)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n_rows += len(processed)
+            if on_progress is not None and progress is not None:
+                on_progress(progress)
+        completed = writer is not None
+    finally:
+        chunks.close()
+        if writer is not None:
+            writer.close()
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if not completed:
+        return None
+    os.replace(tmp_path, path)
+    forget_dataset(key)
+    cleanup_store(keep=key)
+    if on_progress is not None:
+        on_progress(1.0)
+    return n_rows
+
+
+def store_preview(key, n_rows=5):
+    """只读取缓存文件的元数据和开头n_rows行，返回(总行数, 预览DataFrame)，不存在时返回None"""
+    path = store_path(key)
+    if not os.path.exists(path):
+        return None
+    _touch(path)
+    parquet_file = pq.ParquetFile(path)
+    batch = next(parquet_file.iter_batches(batch_size=n_rows), None)
+    if batch is None:
+        head = parquet_file.schema_arrow.empty_table().to_pandas()
+    else:
+        head = batch.to_pandas()
+    return parquet_file.metadata.num_rows, head
+
+
+@instrument()
+def load_reviews(uploaded_file, processed=True):
+    """读取上传的Excel文件
+
+    首次读取时解析Excel并写入Parquet缓存，之后同一文件的重跑直接读取缓存。
+    processed为True时表示预处理后的文件，会转换为分类和日期类型。
+    """
+    key = upload_key(uploaded_file, 'processed' if processed else 'raw')
+    df = load_from_store(key)
+    if df is not None:
+        return df
+
+    df = read_upload(uploaded_file)
+    if processed:
+        df = to_store_dtypes(df)
+    save_to_store(df, key)
+    return load_from_store(key)
@@ -0,0 +1,227 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+import xlsxwriter
+
+from data_store import _coerce_object_columns
+from profiling import instrument
+from text_utils import to_string_arrow
+
+# 可选的下载格式：显示名称 -> (文件扩展名, MIME类型)
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip压缩)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/octet-stream'),
+    'TXT': ('txt', 'text/plain'),
+    'TSV': ('tsv', 'text/tab-separated-values'),
+    'JSONL': ('jsonl', 'application/jsonl'),
+}
+
+# 逐块写出的文本格式
+TEXT_FORMATS = ('TXT', 'TSV', 'JSONL')
+
+# 行数超过该值时Excel使用xlsxwriter的constant_memory模式，逐行写出，内存占用固定
+CONSTANT_MEMORY_ROWS = 100000
+
+# 写Excel时每次转换的行数
+EXCEL_CHUNK_ROWS = 10000
+
+# Excel单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+# 写文本格式时每块的行数
+TEXT_CHUNK_ROWS = 20000
+
+
+def check_excel_rows(df):
+    """行数超出Excel工作表上限时抛出ValueError，xlsxwriter对超出的行不报错而是直接丢弃"""
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"数据共{len(df)}行，超过Excel单个工作表的上限"
+                         f"（{EXCEL_MAX_ROWS - 1}行数据），请改用CSV或Parquet格式")
+
+
+def _excel_values(chunk):
+    """转换为xlsxwriter可以直接写入的值，缺失值写为空单元格"""
+    columns = []
+    for col in chunk.columns:
+        values = chunk[col].astype(object)
+        columns.append(values.where(chunk[col].notna(), None))
+    return zip(*columns)
+
+
+@instrument()
+def to_excel_bytes(df, constant_memory=None):
+    """将DataFrame写为xlsx字节
+
+    直接使用xlsxwriter逐行写入（pandas按列写单元格，无法使用constant_memory模式）。
+    constant_memory为None时按行数自动选择。
+    """
+    check_excel_rows(df)
+    if constant_memory is None:
+        constant_memory = len(df) > CONSTANT_MEMORY_ROWS
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': constant_memory,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        # 评论内容按原样写为文本，不解析为公式或链接
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], workbook.add_format({'bold': True}))
+    row = 1
+    for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+        for values in _excel_values(df.iloc[start:start + EXCEL_CHUNK_ROWS]):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
+    return output.getvalue()
+
+
+def to_parquet_bytes(df):
+    """将DataFrame写为zstd压缩的Parquet字节"""
+    output = io.BytesIO()
+    try:
+        df.to_parquet(output, engine='pyarrow', index=False, compression='zstd')
+    except (TypeError, ValueError):
+        # pyarrow无法推断混合类型列时退化为字符串
+        output = io.BytesIO()
+        _coerce_object_columns(df).to_parquet(output, engine='pyarrow', index=False, compression='zstd')
+    return output.getvalue()
+
+
+def _text_column(values):
+    """将一列转换为Arrow字符串数组，缺失值为空字符串
+
+    文本列直接取Arrow数组，分类列按编号取类别文本，都不创建逐个单元格的Python字符串；
+    数值和日期列仍按pandas的格式转换为文本，与其他导出格式保持一致。
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        categories = pa.array(values.cat.categories.astype(str), type=pa.string())
+        array = pc.take(categories, pa.array(codes, mask=codes < 0))
+    elif values.dtype == object or isinstance(values.dtype, pd.StringDtype):
+        # 只有文本列可能包含换行和制表符
+        array = pc.replace_substring_regex(to_string_arrow(values), r'[\t\r\n]+', ' ')
+    else:
+        array = pa.array(values.astype(object).where(values.notna(), '').astype(str), type=pa.string())
+    return pc.fill_null(array, '').cast(pa.large_string())
+
+
+def _plain_text_lines(chunk):
+    """每行一条评论，字段以制表符分隔，单元格中的换行和制表符替换为空格
+
+    在Arrow中拼接各列，直接返回整块的UTF-8字节，不逐行拼接Python字符串。
+    """
+    columns = [_text_column(chunk[col]) for col in chunk.columns]
+    if not columns or not len(chunk):
+        return b''
+    tab, newline, empty = (pa.scalar(text, type=pa.large_string()) for text in ('\t', '\n', ''))
+    lines = pc.binary_join_element_wise(*columns, tab)
+    lines = pc.binary_join_element_wise(lines, empty, newline)
+    # 各行在数据缓冲区中连续存放，按首尾偏移量截取即为全部行
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int64)[lines.offset:lines.offset + len(lines) + 1]
+    return lines.buffers()[2].to_pybytes()[offsets[0]:offsets[-1]]
+
+
+def iter_text_export(df, file_format, chunk_rows=TEXT_CHUNK_ROWS):
+    """逐块生成TXT、TSV或JSONL格式的字节，内存占用只与chunk_rows有关
+
+    TXT：制表符分隔、不补齐列宽，单元格中的换行和制表符替换为空格，每条评论一行；
+    TSV：制表符分隔，含特殊字符的单元格按CSV规则加引号，内容不做修改；
+    JSONL：每行一个JSON对象，日期为ISO格式。
+    """
+    if file_format not in TEXT_FORMATS:
+        raise ValueError(f"不支持的文本格式: {file_format}")
+    if file_format == 'TXT':
+        yield ('\t'.join(str(col) for col in df.columns) + '\n').encode('utf-8')
+    elif file_format == 'TSV':
+        yield df.iloc[:0].to_csv(sep='\t', index=False, lineterminator='\n').encode('utf-8')
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if file_format == 'TXT':
+            yield _plain_text_lines(chunk)
+            continue
+        if file_format == 'TSV':
+            text = chunk.to_csv(sep='\t', index=False, header=False, lineterminator='\n')
+        else:
+            text = chunk.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+            if not text.endswith('\n'):
+                text += '\n'
+        yield text.encode('utf-8')
+
+
+def write_text_export(df, file_format, output, chunk_rows=TEXT_CHUNK_ROWS):
+    """将TXT、TSV或JSONL逐块写入二进制文件对象"""
+    for data in iter_text_export(df, file_format, chunk_rows):
+        output.write(data)
+
+
+@instrument()
+def export_bytes(df, file_format):
+    """将DataFrame序列化为指定格式的字节，file_format为EXPORT_FORMATS的键"""
+    if file_format == 'Excel':
+        return to_excel_bytes(df)
+    if file_format == 'CSV':
+        # 带BOM，Excel打开时可以正确识别编码
+        return df.to_csv(index=False).encode('utf-8-sig')
+    if file_format == 'CSV (gzip压缩)':
+        return gzip.compress(df.to_csv(index=False).encode('utf-8-sig'), compresslevel=6)
+    if file_format == 'Parquet':
+        return to_parquet_bytes(df)
+    if file_format in TEXT_FORMATS:
+        # 逐块写入缓冲区，不像df.to_string那样按最宽单元格补齐后拼成一个大字符串
+        output = io.BytesIO()
+        write_text_export(df, file_format, output)
+        return output.getvalue()
+    raise ValueError(f"不支持的下载格式: {file_format}")
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def get_export_bytes(data_key, filter_key, file_format, _df):
+    """按数据、筛选条件和格式缓存序列化结果，重跑时直接复用"""
+    return export_bytes(_df, file_format)
+
+
+def download_section(df, data_key, filter_key, file_name, key, formats=tuple(EXPORT_FORMATS)):
+    """显示格式选择和下载按钮
+
+    只有点击"准备下载文件"后才序列化数据，之后同一数据、筛选条件和格式的重跑直接复用缓存的字节。
+    data_key为None（数据不是从缓存读取的）时不缓存。df也可以是返回DataFrame的函数，
+    此时只在需要生成下载文件时才读取数据。
+    """
+    file_format = st.radio("选择下载格式", list(formats), horizontal=True, key=f"{key}_format")
+    ready_key = f"{key}_ready"
+    request = (data_key, filter_key, file_format)
+    if st.button("准备下载文件", key=f"{key}_prepare"):
+        st.session_state[ready_key] = request
+    if st.session_state.get(ready_key) != request:
+        return
+    if callable(df):
+        df = df()
+    if file_format == 'Excel':
+        try:
+            check_excel_rows(df)
+        except ValueError as e:
+            st.error(str(e))
+            return
+
+    with st.spinner("正在生成下载文件..."):
+        if data_key is None:
+            data = export_bytes(df, file_format)
+        else:
+            data = get_export_bytes(data_key, filter_key, file_format, df)
+    ext, mime = EXPORT_FORMATS[file_format]
+    st.download_button(
+        label=f"下载{file_format}文件",
+        data=data,
+        file_name=f"{file_name}.{ext}",
+        mime=mime,
+        key=f"{key}_download"
+    )
@@ -1,13 +1,21 @@
 import streamlit as st
-import pandas as pd
 from utils import (
     calculate_review_stats,
     create_pie_chart,
     analyze_by_group,
     create_rating_heatmap,
     create_rating_trend_chart,
-    save_fig_to_html
+    figure_payload_size,
+    has_session_dataset,
+    line_render_mode,
+    load_page_dataset,
+    rank_heatmap_rows,
+    save_fig_to_html,
+    HEATMAP_PAGE_SIZE,
+    MAX_TREND_GROUPS
 )
+from profiling import instrument, profiled_page, stage
+from rollup import GRANULARITIES, load_rating_cube, rating_trend, rollup_cube
 import plotly.express as px
 
 st.set_page_config(
@@ -16,16 +24,45 @@ st.set_page_config(
     layout="wide"
 )
 
-def create_overall_trend_chart(df):
+# 按数据集缓存的结果最多保留的数据集数量（与倒排索引的内存缓存数量一致），超出后淘汰最久未使用的
+CACHED_DATASETS = 4
+
+# 以下结果按数据集缓存，切换分析维度、粒度、窗口或选择的ASIN时不再扫描原始数据
+@st.cache_data(show_spinner=False, max_entries=CACHED_DATASETS)
+def get_review_stats(data_key, _df):
+    """评论类型的数量和占比"""
+    return calculate_review_stats(_df)
+
+@st.cache_data(show_spinner=False, max_entries=CACHED_DATASETS * 2)
+def get_group_stats(data_key, group_by, _df):
+    """按Asin或Asin+Model分组的统计结果和评分分布"""
+    return analyze_by_group(_df, group_by)
+
+@st.cache_data(show_spinner=False, max_entries=CACHED_DATASETS)
+def get_all_asins(data_key, _df):
+    """排序后的全部Asin"""
+    return sorted(_df['Asin'].unique())
+
+# 立方体只读，使用cache_resource直接共享同一个对象，避免cache_data每次重跑反序列化一份副本
+@st.cache_resource(show_spinner=False, max_entries=CACHED_DATASETS)
+def get_rating_cube(data_key, _df):
+    """按日汇总的评分立方体，每个数据集只计算一次，之后的趋势图只对立方体切片"""
+    return load_rating_cube(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=CACHED_DATASETS * len(GRANULARITIES))
+def get_rollup(data_key, freq, _daily_cube):
+    """由日汇总立方体合并得到的周、月、季度汇总，按数据集和粒度缓存"""
+    return rollup_cube(_daily_cube, freq)
+
+@instrument()
+def create_overall_trend_chart(trend_data):
     """创建整体评分趋势图"""
-    df['Month'] = df['Date'].dt.to_period('M').astype(str)
-    trend_data = df.groupby('Month')['Rating'].mean().reset_index()
-    
     fig = px.line(trend_data, 
-                  x='Month', 
+                  x='Period', 
                   y='Rating',
                   title='整体评分趋势',
-                  labels={'Rating': '平均评分', 'Month': '月份'})
+                  labels={'Rating': '平均评分', 'Period': '时间'},
+                  render_mode=line_render_mode(trend_data))
     
     fig.update_xaxes(tickangle=45)
     return fig
@@ -36,9 +73,10 @@ def main():
     
     uploaded_file = st.file_uploader("选择预处理后的Excel文件", type=['xlsx'])
     
-    if uploaded_file is not None:
+    # 没有上传文件时使用首页或其他页面已经读取的数据
+    if uploaded_file is not None or has_session_dataset():
         try:
-            df = pd.read_excel(uploaded_file)
+            df = load_page_dataset(uploaded_file)
             
             # 验证是否是预处理后的文件
             required_columns = ['ID', 'Asin', 'Title', 'Content', 'Model', 'Rating', 'Date', 'Review Type']
@@ -48,7 +86,8 @@ def main():
             
             # 显示评论类型统计和占比
             st.subheader("整体评论分析")
-            stats_df, review_counts, review_percentages = calculate_review_stats(df)
+            data_key = df.attrs.get('store_key')
+            stats_df, review_counts, review_percentages = get_review_stats(data_key, df)
             
             col1, col2 = st.columns([1, 1])
             with col1:
@@ -72,7 +111,7 @@ def main():
                 group_by = ['Asin', 'Model']
             
             # 获取分组分析结果
-            asin_stats, rating_dist_pct, group_by_trend = analyze_by_group(df, group_by)
+            asin_stats, rating_dist_pct, group_by_trend = get_group_stats(data_key, group_by, df)
             
             # 显示ASIN维度的统计信息
             st.write("ASIN评分统计信息：")
@@ -80,14 +119,34 @@ def main():
             
             # 显示ASIN评分分布热力图
             st.subheader("Asin评分分布热力图")
-            heatmap = create_rating_heatmap(rating_dist_pct, "Asin的评分分布(%)")
-            st.plotly_chart(heatmap, use_container_width=True)
+            # 按评论数量排序后分页显示，避免一次发送全部ASIN
+            ranked_dist = rank_heatmap_rows(rating_dist_pct, asin_stats['评论数量'])
+            n_pages = max((len(ranked_dist) - 1) // HEATMAP_PAGE_SIZE + 1, 1)
+            page = st.number_input(f"热力图页码（共{n_pages}页，按评论数量从多到少排列）",
+                                   min_value=1, max_value=n_pages, value=1)
+            start = (page - 1) * HEATMAP_PAGE_SIZE
+            heatmap = create_rating_heatmap(ranked_dist.iloc[start:start + HEATMAP_PAGE_SIZE],
+                                            "Asin的评分分布(%)")
+            with stage("发送热力图"):
+                st.plotly_chart(heatmap, use_container_width=True)
+            st.caption(f"图表数据大小：{figure_payload_size(heatmap) / 1024:.1f} KB")
             
             # 创建并显示时间趋势图
             st.subheader("评分趋势分析")
             
+            col1, col2 = st.columns(2)
+            with col1:
+                granularity = st.selectbox("时间粒度", list(GRANULARITIES), index=2)
+            with col2:
+                window = st.number_input("滑动平均窗口（时间段数）", min_value=1, value=1,
+                                         help="大于1时显示最近N个时间段按评论数量加权的平均评分")
+            freq = GRANULARITIES[granularity]
+            top_n = st.number_input("趋势图最多显示的分组数", min_value=1, value=MAX_TREND_GROUPS,
+                                    help="只显示评论数量最多的分组，其余分组合并为一条“其他”曲线")
+            cube = get_rollup(data_key, freq, get_rating_cube(data_key, df))
+            
             # 添加ASIN选择功能
-            all_asins = sorted(df['Asin'].unique())
+            all_asins = get_all_asins(data_key, df)
             
             # 创建一个选择框来选择是否查看特定ASIN
             view_specific = st.radio(
@@ -104,21 +163,20 @@ def main():
                 )
                 
                 if selected_asins:
-                    if analysis_type == "按Asin分析":
-                        filtered_df = df[df['Asin'].isin(selected_asins)]
-                        trend_chart = create_rating_trend_chart(filtered_df, 'Asin')
-                    else:
-                        filtered_df = df[df['Asin'].isin(selected_asins)]
-                        filtered_df['Group'] = filtered_df['Asin'] + ' - ' + filtered_df['Model']
-                        trend_chart = create_rating_trend_chart(filtered_df, 'Group')
+                    trend_data = rating_trend(cube, by=group_by_trend, asins=selected_asins,
+                                              freq=freq, window=window, top_n=top_n)
                 else:
                     # 如果没有选择ASIN，显示所有ASIN的趋势
-                    trend_chart = create_rating_trend_chart(df, group_by_trend)
+                    trend_data = rating_trend(cube, by=group_by_trend, freq=freq, window=window,
+                                              top_n=top_n)
+                trend_chart = create_rating_trend_chart(trend_data, group_by_trend)
             else:
                 # 显示整体趋势
-                trend_chart = create_overall_trend_chart(df)
+                trend_chart = create_overall_trend_chart(rating_trend(cube, freq=freq, window=window))
             
-            st.plotly_chart(trend_chart, use_container_width=True)
+            with stage("发送趋势图"):
+                st.plotly_chart(trend_chart, use_container_width=True)
+            st.caption(f"图表数据大小：{figure_payload_size(trend_chart) / 1024:.1f} KB")
             
             # 添加图表下载按钮
             st.subheader("图表下载")
@@ -155,4 +213,5 @@ def main():
             st.error(f"处理文件时出错: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with profiled_page("统计分析"):
+        main() 
\ No newline at end of file
@@ -10,133 +10,125 @@ st.set_page_config(
 import pandas as pd
 import numpy as np
 from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 from collections import Counter
-import re
+from concurrent.futures import ThreadPoolExecutor
+import io
 import plotly.graph_objects as go
-import json
-import os
-
-def load_stop_words():
-    """加载停用词"""
-    # 基础英文停用词
-    stop_words = {
-        # 人称代词
-        'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're",
-        "you've", "you'll", "you'd", 'your', 'yours', 'yourself', 'yourselves',
-        'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers', 'herself',
-        'it', "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
-        
-        # 疑问词和指示词
-        'what', 'which', 'who', 'whom', 'this', 'that', "that'll", 'these', 'those',
-        'where', 'when', 'why', 'how', 'whose',
-        
-        # 常见动词和助动词
-        'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
-        'had', 'having', 'do', 'does', 'did', 'doing', 'will', 'would', 'shall',
-        'should', 'can', 'could', 'may', 'might', 'must', 'ought', 'need', 'dare',
-        
-        # 介词和连词
-        'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while',
-        'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into',
-        'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from',
-        'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further',
-        'then', 'once', 'here', 'there', 'all', 'any', 'both', 'each',
-        
-        # 常见副词和形容词
-        'just', 'now', 'only', 'very', 'really', 'quite', 'rather', 'somewhat',
-        'more', 'most', 'much', 'many', 'some', 'such', 'no', 'nor', 'not',
-        'too', 'very', 'same', 'different', 'other', 'another', 'like', 'unlike',
-        
-        # 时间相关词
-        'today', 'tomorrow', 'yesterday', 'now', 'later', 'earlier', 'soon',
-        'already', 'yet', 'still', 'always', 'never', 'ever', 'often', 'sometimes',
-        
-        # 数量词和序数词
-        'one', 'two', 'three', 'first', 'second', 'third', 'next', 'last',
-        'few', 'several', 'many', 'much', 'more', 'most', 'own', 'every',
-        
-        # 其他常见词
-        'yes', 'no', 'maybe', 'ok', 'okay', 'right', 'wrong', 'well', 'anyway',
-        'however', 'although', 'though', 'despite', 'unless', 'whereas',
-        'whether', 'whatever', 'whoever', 'whenever', 'wherever', 'however',
-        
-        # 网络用语和缩写
-        'lol', 'omg', 'idk', 'tbh', 'imo', 'imho', 'fyi', 'asap', 'aka'
-    }
-    
-    # 添加一些自定义停用词（与产品评论相关）
-    custom_stop_words = {
-        # 产品相关
-        'amazon', 'product', 'item', 'purchase', 'bought', 'buy', 'seller',
-        'shipping', 'delivery', 'arrived', 'ordered', 'received', 'return',
-        'customer', 'service', 'price', 'worth', 'money', 'paid', 'cost',
-        
-        # 评论常用词
-        'would', 'could', 'get', 'use', 'using', 'used', 'recommend',
-        'recommended', 'definitely', 'probably', 'maybe', 'think', 'thought',
-        'seems', 'looked', 'looks', 'looking', 'came', 'come', 'goes', 'going',
-        'got', 'getting', 'make', 'makes', 'made', 'making',
-        
-        # 时间和状态
-        'day', 'days', 'week', 'weeks', 'month', 'months', 'year', 'years',
-        'time', 'times', 'ago', 'since', 'far', 'long', 'short',
-        
-        # 评分相关
-        'star', 'stars', 'rating', 'rated', 'review', 'reviews', 'reviewed'
+from utils import has_session_dataset, load_page_dataset
+from profiling import instrument, profiled_page
+from text_utils import (
+    NGRAM_MAX_ENTRIES,
+    load_token_index,
+    count_ngrams,
+    load_stop_words,
+    load_negative_words,
+    save_negative_words
+)
+
+# 按数据集缓存的词频最多保留的数据集数量，超出后淘汰最久未使用的
+CACHED_DATASETS = 4
+
+# 每种评论类型（positive/neutral/negative/all）一项
+REVIEW_TYPE_KEYS = 4
+
+@st.cache_data(show_spinner=False, max_entries=CACHED_DATASETS)
+def get_review_type_totals(data_key, _token_index, _review_types):
+    """每种评论类型的完整词频（未过滤停用词和否定词），每个数据集只计算一次"""
+    totals = _token_index.term_totals_by_group(_review_types)
+    totals['all'] = sum(totals.values()) if totals else np.zeros(len(_token_index.terms), dtype=np.int64)
+    return totals
+
+# 过滤后的词频还按过滤词集合缓存，每次增删否定词都会产生新的一项，只保留最近的
+@st.cache_data(show_spinner=False, max_entries=CACHED_DATASETS * REVIEW_TYPE_KEYS)
+def get_word_freq(data_key, review_type, excluded_words, _token_index, _totals):
+    """从缓存的词频中过滤停用词、否定词和过短的词"""
+    if review_type not in _totals:
+        return Counter()
+    keep = _token_index.term_mask(excluded_words, min_length=3)  # 移除过短的词
+    return _token_index.to_counter(_totals[review_type], keep)
+
+# 近似统计时最多保留的词语数量，内存占用与词表大小无关
+HEAVY_HITTER_CAPACITY = 5000
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_phrase_freq(data_key, review_type, n, excluded_words, max_entries, _texts):
+    """统计评论中的n元词组（n=1时为单词）频率，按数据、评论类型、n、过滤词和保留数量缓存
+
+    max_entries为None时精确统计，否则只保留出现最多的max_entries项，低频项的计数是近似值。
+    """
+    return count_ngrams(_texts, n=n, exclude=excluded_words, min_length=3,
+                        min_count=1 if n == 1 else 2, max_entries=max_entries)
+
+def get_freq_by_type(df, review_types, review_type, n, excluded_words, token_index, totals, exact=True):
+    """获取指定评论类型的单词（n=1）或n元词组频率
+
+    exact只对单词有效：为True时从倒排索引精确统计，为False时使用有界内存的近似统计。
+    词组的数量随语料增长很快，始终最多保留NGRAM_MAX_ENTRIES个。
+    """
+    data_key = df.attrs.get('store_key')
+    if n == 1 and exact:
+        return get_word_freq(data_key, review_type, excluded_words, token_index, totals)
+    texts = df['Content'] if review_type == 'all' else df.loc[review_types == review_type, 'Content']
+    if n > 1:
+        max_entries = NGRAM_MAX_ENTRIES
+    else:
+        max_entries = None if exact else HEAVY_HITTER_CAPACITY
+    return get_phrase_freq(data_key, review_type, n, excluded_words, max_entries, texts)
+
+# 词云图参数
+WORDCLOUD_SETTINGS = {
+    'width': 800,
+    'height': 400,
+    'background_color': 'white',
+    'max_words': 100,
+    'random_state': 42  # 固定布局，相同词频总是得到相同的图片
+}
+
+def top_word_items(word_freq, max_words=WORDCLOUD_SETTINGS['max_words']):
+    """取词云实际使用的前N个词频，作为渲染缓存的键"""
+    return tuple(word_freq.most_common(max_words))
+
+@instrument()
+def render_wordcloud(top_words, settings):
+    """布局词云并输出PNG和SVG字节，不创建matplotlib图表"""
+    wordcloud = WordCloud(**settings).generate_from_frequencies(dict(top_words))
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format='PNG')
+    return {
+        'png': buffer.getvalue(),
+        'svg': wordcloud.to_svg().encode('utf-8')
     }
-    
-    return stop_words.union(custom_stop_words)
-
-def load_negative_words():
-    """从文件加载否定词列表"""
-    if os.path.exists('negative_words.json'):
-        with open('negative_words.json', 'r') as f:
-            return set(json.load(f))
-    return set()
-
-def save_negative_words(words):
-    """保存否定词列表到文件"""
-    with open('negative_words.json', 'w') as f:
-        json.dump(list(words), f)
-
-def process_text(text, stop_words, negative_words):
-    """处理文本，提取词语"""
-    if pd.isna(text):
-        return []
-    
-    # 转换为小写并分词
-    text = str(text).lower()
-    # 使用正则表达式分词，保留字母和数字
-    words = re.findall(r'\b[a-z0-9]+\b', text)
-    
-    # 过滤词
-    filtered_words = [word for word in words 
-                     if word not in stop_words 
-                     and word not in negative_words
-                     and len(word) > 2]  # 移除过短的词
-    
-    return filtered_words
-
-def create_wordcloud(text_data, negative_words):
-    """创建词云图"""
-    wordcloud = WordCloud(
-        width=800,
-        height=400,
-        background_color='white',
-        max_words=100,
-        stopwords=negative_words
-    ).generate_from_frequencies(text_data)
-    
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation='bilinear')
-    ax.axis('off')
-    return fig
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def create_wordcloud(top_words, settings=None):
+    """创建词云图，按前N个词频和参数缓存，返回{'png': 字节, 'svg': 字节}"""
+    return render_wordcloud(top_words, settings or WORDCLOUD_SETTINGS)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def create_wordclouds(top_words_by_type, settings=None):
+    """并行创建多个词云图，返回{评论类型: {'png': 字节, 'svg': 字节}}"""
+    settings = settings or WORDCLOUD_SETTINGS
+    items = [(name, top_words) for name, top_words in top_words_by_type if top_words]
+    with ThreadPoolExecutor(max_workers=max(len(items), 1)) as executor:
+        images = executor.map(lambda item: render_wordcloud(item[1], settings), items)
+        return {name: image for (name, _), image in zip(items, images)}
+
+def show_wordcloud(images, file_name):
+    """显示词云图并提供PNG/SVG下载"""
+    st.image(images['png'], use_column_width=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("下载PNG", data=images['png'], file_name=f"{file_name}.png",
+                           mime="image/png", key=f"{file_name}_png")
+    with col2:
+        st.download_button("下载SVG", data=images['svg'], file_name=f"{file_name}.svg",
+                           mime="image/svg+xml", key=f"{file_name}_svg")
+
+@instrument()
 def create_word_freq_table(word_freq, top_n=50):
     """创建词频统计表"""
-    df = pd.DataFrame(list(word_freq.items()), columns=['Word', 'Frequency'])
-    df = df.sort_values('Frequency', ascending=False).head(top_n)
+    # 只取前top_n项，不对全部词频排序
+    df = pd.DataFrame(word_freq.most_common(top_n), columns=['Word', 'Frequency'])
     
     fig = go.Figure(data=[
         go.Table(
@@ -161,9 +153,10 @@ def main():
     # 文件上传
     uploaded_file = st.file_uploader("选择预处理后的Excel文件", type=['xlsx'])
     
-    if uploaded_file is not None:
+    # 没有上传文件时使用首页或其他页面已经读取的数据
+    if uploaded_file is not None or has_session_dataset():
         try:
-            df = pd.read_excel(uploaded_file)
+            df = load_page_dataset(uploaded_file)
             
             # 验证文件格式
             required_columns = ['Content', 'Review Type']
@@ -216,19 +209,53 @@ def main():
             if negative_words:
                 st.write("当前否定词列表：", ", ".join(sorted(negative_words)))
             
-            # 处理文本
-            all_words = []
-            for text in filtered_df['Content']:
-                all_words.extend(process_text(text, stop_words, negative_words))
+            # 选择统计单词还是词组
+            gram_type = st.radio("统计对象", ["单词", "二元词组", "三元词组"], horizontal=True,
+                                 help="词组由评论中连续的词组成，例如battery life、runs small")
+            gram_n = {"单词": 1, "二元词组": 2, "三元词组": 3}[gram_type]
+            # 词组统计始终有数量上限，精确统计只用于单词
+            exact = gram_n == 1 and st.toggle(
+                "精确统计", value=True,
+                help=f"关闭后只保留出现最多的{HEAVY_HITTER_CAPACITY}个词语，"
+                     "内存占用固定，高频词排名基本不变，低频词的计数为近似值")
             
-            # 计算词频
-            word_freq = Counter(all_words)
+            # 每种评论类型的词频按数据集缓存，切换类型或修改否定词时只重新过滤
+            data_key = df.attrs.get('store_key')
+            token_index = load_token_index(df) if exact and gram_n == 1 else None
+            review_types = df['Review Type'].astype(str).str.lower().to_numpy()
+            totals = get_review_type_totals(data_key, token_index, review_types) if token_index is not None else None
+            type_key = {
+                "Positive评论": 'positive',
+                "Negative评论": 'negative',
+                "Neutral评论": 'neutral'
+            }.get(review_type, 'all')
+            excluded_words = tuple(sorted(stop_words | negative_words))
+            word_freq = get_freq_by_type(df, review_types, type_key, gram_n, excluded_words, token_index, totals,
+                                         exact)
             
             if word_freq:
                 # 创建词云图
                 st.subheader("词云图")
-                wordcloud_fig = create_wordcloud(word_freq, negative_words)
-                st.pyplot(wordcloud_fig)
+                show_wordcloud(create_wordcloud(top_word_items(word_freq)), f"wordcloud_{type_key}")
+                
+                # 同时查看各评论类型的词云
+                if st.checkbox("同时生成各评论类型的词云"):
+                    top_words_by_type = tuple(
+                        (name, top_word_items(
+                            get_freq_by_type(df, review_types, name, gram_n, excluded_words, token_index, totals,
+                                             exact)
+                        ))
+                        for name in ['positive', 'neutral', 'negative']
+                    )
+                    images_by_type = create_wordclouds(top_words_by_type)
+                    columns = st.columns(len(top_words_by_type))
+                    for column, (name, _) in zip(columns, top_words_by_type):
+                        with column:
+                            st.write(f"**{name}**")
+                            if name in images_by_type:
+                                show_wordcloud(images_by_type[name], f"wordcloud_{name}_compare")
+                            else:
+                                st.info("没有符合条件的词语")
                 
                 # 创建词频统计表
                 st.subheader("词频统计表")
@@ -241,4 +268,5 @@ def main():
             st.error(f"处理文件时出错: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with profiled_page("词云分析"):
+        main() 
\ No newline at end of file
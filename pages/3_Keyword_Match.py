@@ -11,6 +11,10 @@ import pandas as pd
 import json
 import os
 from collections import defaultdict
+from utils import has_session_dataset, load_page_dataset
+from export import download_section
+from profiling import instrument, profiled_page
+from text_utils import CategoryMatcher, load_token_index, normalize_categories
 
 def load_categories():
     """从文件加载已保存的类别和关键词"""
@@ -24,26 +28,34 @@ def save_categories(categories):
     with open('categories.json', 'w', encoding='utf-8') as f:
         json.dump(categories, f, ensure_ascii=False, indent=2)
 
-def match_keywords(text, keywords):
-    """检查文本是否包含关键词列表中的任何词"""
-    if pd.isna(text):
-        return False
-    text = str(text).lower()
-    return any(keyword.lower().strip() in text for keyword in keywords)
+def get_category_matcher(categories):
+    """获取当前会话的关键词匹配器，只重新编译关键词有变化的类别"""
+    if 'category_matcher' not in st.session_state:
+        st.session_state.category_matcher = CategoryMatcher()
+    matcher = st.session_state.category_matcher
+    matcher.update(categories)
+    return matcher
 
-def analyze_reviews(df, categories):
-    """分析评论并进行分类"""
+@instrument()
+def analyze_reviews(df, categories, matcher=None, token_index=None):
+    """分析评论并进行分类，提供token_index时按整词匹配，否则按子串匹配"""
     # 创建结果DataFrame
     results = pd.DataFrame()
     results['Content'] = df['Content']
     results['Original Review Type'] = df['Review Type']
     
-    # 为每个类别创建一列
+    # 所有类别的匹配矩阵一次计算完成，每个类别一列
+    if token_index is not None:
+        matches = token_index.match_categories(categories, df['Content'])
+        matches.index = df.index
+    else:
+        if matcher is None:
+            matcher = CategoryMatcher()
+            matcher.update(categories)
+        # 关键词未变化的类别和已匹配过的行直接复用上一次的结果
+        matches = matcher.match(df['Content'], data_key=df.attrs.get('store_key'))
     for category in categories:
-        keywords = [k.strip() for k in categories[category].split(',')]
-        results[f'Is {category}'] = df['Content'].apply(
-            lambda x: match_keywords(x, keywords)
-        )
+        results[f'Is {category}'] = matches[category]
     
     # 统计每个类别的匹配数量
     stats = {}
@@ -105,8 +117,8 @@ def main():
                     save_categories(categories)
                     st.rerun()
         
-        # 如果关键词有修改，保存更新
-        if edited_categories != categories:
+        # 只有关键词集合真正变化时才保存更新
+        if normalize_categories(edited_categories) != normalize_categories(categories):
             categories = edited_categories
             save_categories(categories)
         
@@ -114,9 +126,10 @@ def main():
         st.subheader("评论分析")
         uploaded_file = st.file_uploader("选择预处理后的Excel文件", type=['xlsx'])
         
-        if uploaded_file is not None:
+        # 没有上传文件时使用首页或其他页面已经读取的数据
+        if uploaded_file is not None or has_session_dataset():
             try:
-                df = pd.read_excel(uploaded_file)
+                df = load_page_dataset(uploaded_file)
                 
                 # 验证文件格式
                 required_columns = ['Content', 'Review Type']
@@ -124,8 +137,20 @@ def main():
                     st.error("请上传包含Content和Review Type列的预处理文件！")
                     return
                 
+                # 选择匹配方式
+                match_mode = st.radio(
+                    "匹配方式",
+                    ["子串匹配", "整词匹配", "整词匹配（含词干变体）"],
+                    horizontal=True,
+                    help="整词匹配不会把关键词匹配到其他词内部；含词干变体时size/sizes、fit/fits/fitting等会互相匹配"
+                )
+                
                 # 分析评论
-                results, stats = analyze_reviews(df, categories)
+                if match_mode == "子串匹配":
+                    results, stats = analyze_reviews(df, categories, get_category_matcher(categories))
+                else:
+                    token_index = load_token_index(df, stem=match_mode != "整词匹配")
+                    results, stats = analyze_reviews(df, categories, token_index=token_index)
                 
                 # 显示统计信息
                 st.subheader("匹配统计")
@@ -146,18 +171,10 @@ def main():
                 # 下载结果
                 st.subheader("下载分析结果")
                 
-                # 转换为Excel
-                excel_buffer = pd.ExcelWriter(pd.io.common.BytesIO(), engine='xlsxwriter')
-                results.to_excel(excel_buffer, index=False)
-                excel_buffer.close()
-                excel_data = excel_buffer.handles.handle.getvalue()
-                
-                st.download_button(
-                    label="下载Excel文件",
-                    data=excel_data,
-                    file_name="keyword_match_results.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # 点击后才生成下载文件，结果按数据、匹配方式和匹配器版本（类别及关键词集合）缓存
+                filter_key = (match_mode, get_category_matcher(categories).version)
+                download_section(results, df.attrs.get('store_key'), filter_key,
+                                 "keyword_match_results", key="keyword_match")
                 
             except Exception as e:
                 st.error(f"处理文件时出错: {str(e)}")
@@ -165,4 +182,5 @@ def main():
         st.info("请先添加类别和关键词")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with profiled_page("关键词匹配"):
+        main() 
\ No newline at end of file
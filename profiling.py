@@ -0,0 +1,199 @@
+"""按阶段记录耗时和内存的诊断工具
+
+默认关闭，不产生任何开销。页面通过profiled_page开启后，被instrument装饰的函数和stage包围的
+代码块会记录耗时、进程内存（RSS）和处理的行数，显示在侧边栏并可导出为JSON。
+RSS是整个进程的内存，多个会话同时运行时会互相影响。
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # 可选依赖，没有时在Linux上读取/proc
+    psutil = None
+
+# 每个会话保留的最近运行记录数
+MAX_RUNS = 20
+
+# 阶段运行期间采样RSS的间隔（秒）
+SAMPLE_INTERVAL = 0.01
+
+# 当前线程正在记录的运行，Streamlit每个会话的脚本在各自的线程中执行
+_local = threading.local()
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _PeakSampler(threading.Thread):
+    """在后台线程中定期采样RSS，记录阶段运行期间的峰值"""
+
+    def __init__(self, initial):
+        super().__init__(daemon=True)
+        self.peak = initial
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            rss = current_rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def _to_mb(value):
+    return round(value / 2 ** 20, 1) if value is not None else None
+
+
+def is_enabled():
+    """当前线程是否正在记录"""
+    return getattr(_local, 'run', None) is not None
+
+
+def start_run(name):
+    """开始记录一次运行（一次页面重跑），返回运行记录"""
+    _local.run = {
+        'page': name,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'seconds': None,
+        'stages': [],
+    }
+    _local.depth = 0
+    _local.start = time.perf_counter()
+    return _local.run
+
+
+def finish_run():
+    """结束当前运行的记录并返回运行记录，没有正在记录的运行时返回None"""
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['seconds'] = round(time.perf_counter() - _local.start, 4)
+    _local.run = None
+    return run
+
+
+def _row_count(values):
+    """取第一个DataFrame、Series或数组的行数"""
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray)):
+            return len(value)
+    return None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """记录一个阶段的耗时和内存，未开启记录时直接执行
+
+    yield一个字典，可以在阶段内设置rows（处理的行数）。
+    """
+    run = getattr(_local, 'run', None)
+    if run is None:
+        yield {}
+        return
+
+    record = {'stage': name, 'depth': _local.depth, 'rows': rows}
+    run['stages'].append(record)
+    rss_before = current_rss()
+    sampler = _PeakSampler(rss_before)
+    sampler.start()
+    _local.depth += 1
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        _local.depth -= 1
+        peak = sampler.stop()
+        rss_after = current_rss()
+        if peak is not None and rss_after is not None:
+            peak = max(peak, rss_after)
+        record['rss_before_mb'] = _to_mb(rss_before)
+        record['rss_after_mb'] = _to_mb(rss_after)
+        record['peak_rss_mb'] = _to_mb(peak)
+
+
+def instrument(name=None):
+    """装饰器：开启记录时把函数调用作为一个阶段记录，行数取第一个表格参数或返回值的长度"""
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with stage(stage_name, _row_count(list(args) + list(kwargs.values()))) as record:
+                result = func(*args, **kwargs)
+                if record.get('rows') is None:
+                    record['rows'] = _row_count([result])
+                return result
+        return wrapper
+    return decorator
+
+
+def runs_to_json(runs):
+    """将运行记录导出为JSON文本"""
+    return json.dumps(runs, ensure_ascii=False, indent=2)
+
+
+def stages_table(run):
+    """运行记录中的阶段转换为表格，嵌套阶段按层级缩进"""
+    rows = [{
+        '阶段': '　' * record['depth'] + record['stage'],
+        '耗时(s)': record.get('seconds'),
+        '行数': record.get('rows'),
+        'RSS峰值(MB)': record.get('peak_rss_mb'),
+        'RSS变化(MB)': (round(record['rss_after_mb'] - record['rss_before_mb'], 1)
+                      if record.get('rss_after_mb') is not None and record.get('rss_before_mb') is not None
+                      else None),
+    } for record in run['stages']]
+    return pd.DataFrame(rows, columns=['阶段', '耗时(s)', '行数', 'RSS峰值(MB)', 'RSS变化(MB)'])
+
+
+@contextmanager
+def profiled_page(name):
+    """包围页面的main()：侧边栏提供开关，开启时记录本次重跑的各阶段并显示诊断面板"""
+    import streamlit as st
+
+    enabled = st.sidebar.checkbox("性能诊断", key='profiling_enabled',
+                                  help="记录每次运行各阶段的耗时、内存和行数，用于定位慢的步骤")
+    if not enabled:
+        yield
+        return
+
+    start_run(name)
+    try:
+        yield
+    finally:
+        run = finish_run()
+        runs = st.session_state.setdefault('profiling_runs', [])
+        runs.append(run)
+        del runs[:-MAX_RUNS]
+        with st.sidebar:
+            st.subheader("性能诊断")
+            st.write(f"本次运行：{run['seconds']:.2f}s")
+            st.dataframe(stages_table(run), hide_index=True, use_container_width=True)
+            st.download_button("导出诊断记录(JSON)", data=runs_to_json(runs),
+                               file_name="profiling.json", mime="application/json",
+                               key='profiling_download')
+            if st.button("清空诊断记录", key='profiling_clear'):
+                runs.clear()
@@ -0,0 +1,117 @@
+import pandas as pd
+
+from data_store import load_from_store, save_to_store
+from profiling import instrument
+from utils import combine_categories
+
+# 汇总立方体的维度（时间段之外）
+CUBE_DIMENSIONS = ['Asin', 'Model', 'Rating']
+
+# 可选的时间粒度
+GRANULARITIES = {'日': 'D', '周': 'W', '月': 'M', '季度': 'Q'}
+
+# 各粒度时间段起始日期的频率，用于补齐没有评论的时间段
+PERIOD_STARTS = {'D': 'D', 'W': 'W-MON', 'M': 'MS', 'Q': 'QS'}
+
+# 超出显示数量的分组合并后的名称
+OTHER_LABEL = '其他'
+
+
+@instrument()
+def build_rating_cube(df, freq='D'):
+    """按(时间段, Asin, Model, 评分)汇总评论数量
+
+    Period列为时间段的起始日期。没有日期或评分的评论不计入。
+    """
+    cube = pd.DataFrame({
+        'Period': df['Date'].dt.to_period(freq).dt.start_time,
+        'Asin': df['Asin'],
+        'Model': df['Model'],
+        'Rating': pd.to_numeric(df['Rating'], errors='coerce'),
+    }).dropna(subset=['Period', 'Rating'])
+    return (cube.groupby(['Period'] + CUBE_DIMENSIONS, observed=True)
+            .size()
+            .rename('Count')
+            .reset_index())
+
+
+@instrument()
+def load_rating_cube(df, freq='D'):
+    """获取df的汇总立方体，优先读取Parquet缓存，没有时构建并保存"""
+    store_key = df.attrs.get('store_key')
+    if store_key is None:
+        return build_rating_cube(df, freq)
+
+    key = f"{store_key}-cube-{freq}"
+    cube = load_from_store(key)
+    if cube is None:
+        save_to_store(build_rating_cube(df, freq), key)
+        cube = load_from_store(key)
+    return cube
+
+
+@instrument()
+def rollup_cube(cube, freq):
+    """将日汇总立方体合并为周、月或季度汇总，不需要重新扫描评论数据"""
+    if freq == 'D':
+        return cube
+    periods = cube['Period'].dt.to_period(freq).dt.start_time
+    return (cube.assign(Period=periods)
+            .groupby(['Period'] + CUBE_DIMENSIONS, observed=True)['Count']
+            .sum()
+            .reset_index())
+
+
+def period_labels(periods, freq):
+    """时间段的显示文本，例如2024-03-01、2024-03、2024Q1"""
+    if freq == 'Q':
+        return periods.dt.to_period('Q').astype(str)
+    return periods.dt.strftime('%Y-%m' if freq == 'M' else '%Y-%m-%d')
+
+
+def limit_groups(labels, counts, top_n):
+    """只保留评论数量最多的top_n个分组，其余分组合并为OTHER_LABEL"""
+    totals = counts.groupby(labels, observed=True).sum()
+    if len(totals) <= top_n:
+        return labels
+    top = totals.nlargest(top_n).index
+    return labels.astype(str).where(labels.isin(top), OTHER_LABEL)
+
+
+@instrument()
+def rating_trend(cube, by=None, asins=None, freq='M', window=1, top_n=None):
+    """从汇总立方体计算各时间段的平均评分
+
+    cube为rollup_cube按freq汇总后的立方体。by为None时计算整体趋势，为'Asin'时按Asin，
+    为'Group'时按Asin-Model组合；asins不为None时只保留这些Asin。
+    window大于1时计算最近window个时间段的滑动平均评分（按评论数量加权）。
+    top_n不为None时只显示评论数量最多的top_n个分组，其余合并为一条"其他"曲线。
+    返回包含Period（显示文本）、分组列和Rating列的DataFrame。
+    """
+    if asins is not None:
+        cube = cube[cube['Asin'].isin(asins)]
+    cube = cube.assign(Sum=cube['Rating'] * cube['Count'])
+    keys = ['Period']
+    if by == 'Group':
+        cube = cube.assign(Group=combine_categories(cube['Asin'], cube['Model']))
+    if by is not None:
+        keys.append(by)
+        if top_n is not None:
+            cube[by] = limit_groups(cube[by], cube['Count'], top_n)
+
+    trend = cube.groupby(keys, observed=True)[['Sum', 'Count']].sum()
+    if window > 1 and len(trend):
+        # 补齐没有评论的时间段后按时间段滚动求和
+        wide = trend.unstack(by) if by is not None else trend
+        periods = wide.index
+        wide = wide.reindex(pd.date_range(periods.min(), periods.max(), freq=PERIOD_STARTS[freq]),
+                            fill_value=0)
+        wide = wide.rolling(window, min_periods=1).sum()
+        wide.index.name = 'Period'
+        trend = wide.stack(by, future_stack=True) if by is not None else wide
+        trend = trend[trend['Count'] > 0]
+
+    trend = trend.reset_index()
+    trend['Rating'] = trend['Sum'] / trend['Count']
+    trend['Period'] = period_labels(trend['Period'], freq)
+    return trend[keys + ['Rating']]
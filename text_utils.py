@@ -0,0 +1,702 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import scipy.sparse as sp
+
+from data_store import STORE_DIR, store_path, temp_path
+from profiling import instrument
+
+# RE2正则中需要转义的字符
+REGEX_SPECIAL_CHARS = set('\\^$.|?*+()[]{}')
+
+# 分词规则：保留字母和数字
+TOKEN_PATTERN = re.compile(r'\b[a-z0-9]+\b')
+
+# 批量分词时的分隔符：Python正则中\w以外的字符（\w包含Unicode字母、数字和下划线）
+NON_WORD_PATTERN = r'[^\p{L}\p{N}_]+'
+
+# 文本处理的并行进程数，默认使用全部CPU，可通过环境变量TEXT_WORKERS配置
+TEXT_WORKERS = int(os.environ.get('TEXT_WORKERS', 0)) or os.cpu_count() or 1
+
+# 每个进程至少处理的行数，数据量较小时直接在当前进程中计算
+MIN_ROWS_PER_WORKER = 20000
+
+# 词组统计默认最多保留的词组数量，保证百万级评论上的内存占用有上限
+NGRAM_MAX_ENTRIES = 500000
+
+# 进程池由所有会话线程共享，创建、替换进程池和提交任务时需持有_POOL_LOCK
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def tokenize(text):
+    """将文本转换为小写并分词，空值返回空列表"""
+    if pd.isna(text):
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def _pool_map(func, workers, *iterables):
+    """在共享进程池中执行func，返回结果列表
+
+    已有的进程池进程数不少于workers时直接复用，需要更多进程时换成新的进程池。
+    任务在持有锁时全部提交，之后其他会话替换进程池时，旧进程池会先执行完已提交的任务再退出。
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS < workers:
+            if _POOL is not None:
+                # wait=False只是不阻塞当前线程，已提交的任务仍会执行完
+                _POOL.shutdown(wait=False)
+            # Streamlit服务进程是多线程的，使用spawn避免fork带来的锁问题
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _POOL_WORKERS = workers
+        futures = [_POOL.submit(func, *args) for args in zip(*iterables)]
+    return [future.result() for future in futures]
+
+
+def _shard_bounds(n_rows, workers):
+    """计算分片边界，数据量不足以并行时返回None"""
+    n_shards = min(workers, n_rows // MIN_ROWS_PER_WORKER)
+    if n_shards <= 1:
+        return None
+    return np.linspace(0, n_rows, n_shards + 1).astype(np.int64)
+
+
+def _map_shards(func, texts, workers, *args):
+    """将文本按行分片，在进程池中对每个分片执行func
+
+    每个分片单独转换为Arrow数组，进程间只传递该分片的Arrow缓冲区。
+    返回(各分片起始行号, 各分片结果)，不需要并行时返回None。
+    """
+    bounds = _shard_bounds(len(texts), workers)
+    if bounds is None:
+        return None
+    shards = [to_string_arrow(texts.iloc[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+    repeated = [[arg] * len(shards) for arg in args]
+    return bounds[:-1], _pool_map(func, workers, shards, *repeated)
+
+
+def _tokenize_array(array):
+    """对Arrow字符串数组分词，返回(行号数组, 词编号数组, 词表)"""
+    parts = pc.split_pattern_regex(pc.utf8_lower(array), pattern=NON_WORD_PATTERN)
+    pieces = pc.list_flatten(parts)
+    keep = pc.match_substring_regex(pieces, pattern=r'^[a-z0-9]+$')
+    rows = pc.filter(pc.list_parent_indices(parts), keep).to_numpy().astype(np.int64)
+    encoded = pc.dictionary_encode(pc.filter(pieces, keep))
+    codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    terms = encoded.dictionary.to_numpy(zero_copy_only=False).astype(object)
+    return rows, codes, terms
+
+
+def tokenize_batch(texts, workers=1):
+    """批量分词，结果与逐条调用tokenize一致
+
+    按非单词字符切分后只保留完全由小写字母和数字组成的片段，等价于TOKEN_PATTERN的
+    单词边界规则，全部在Arrow中完成，不产生逐条的Python列表。
+    workers大于1且数据量足够时分片到多个进程中处理后合并。
+    返回(行号数组, 词编号数组, 词表)。
+    """
+    sharded = _map_shards(_tokenize_array, texts, workers)
+    if sharded is None:
+        return _tokenize_array(to_string_arrow(texts))
+
+    # 合并各分片：行号加上分片偏移，分片词表合并为全局词表
+    starts, results = sharded
+    all_terms = np.concatenate([terms for _, _, terms in results])
+    global_codes, terms = pd.factorize(all_terms)
+    rows, codes = [], []
+    offset = 0
+    for start, (shard_rows, shard_codes, shard_terms) in zip(starts, results):
+        rows.append(shard_rows + start)
+        codes.append(global_codes[offset:offset + len(shard_terms)][shard_codes])
+        offset += len(shard_terms)
+    return np.concatenate(rows), np.concatenate(codes).astype(np.int64), np.asarray(terms, dtype=object)
+
+
+class SpaceSaving:
+    """可合并的Space-Saving高频项统计
+
+    最多保留capacity个计数器，内存占用与不同项的数量无关。每个计数是真实次数的上界，
+    高估不超过errors中对应的值；未被保留的项真实次数不超过floor。
+    capacity为None时不做裁剪，结果精确。
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+        self.floor = 0
+
+    def update(self, items, counts):
+        """合并一批精确计数（items不重复）"""
+        batch = pd.Series(np.asarray(counts, dtype=np.int64), index=pd.Index(items, dtype=object))
+        is_new = ~batch.index.isin(self.counts.index)
+        # 新出现的项之前可能已被淘汰过，按已淘汰的最大计数补足上界
+        batch[is_new] += self.floor
+        new_errors = pd.Series(self.floor, index=batch.index[is_new], dtype=np.int64)
+
+        self.counts = self.counts.add(batch, fill_value=0).astype(np.int64)
+        self.errors = pd.concat([self.errors, new_errors])
+        if self.capacity is not None and len(self.counts) > self.capacity:
+            kept = self.counts.nlargest(self.capacity, keep='first')
+            self.floor = max(self.floor, int(self.counts.drop(kept.index).max()))
+            self.counts = kept
+        self.errors = self.errors.reindex(self.counts.index)
+
+    def top(self, k):
+        """返回计数最高的k项[(项, 计数)]"""
+        top = self.counts.nlargest(k, keep='first')
+        return list(zip(top.index, top.tolist()))
+
+    def to_counter(self, min_count=1):
+        """转换为Counter，只保留计数不少于min_count的项"""
+        counts = self.counts[self.counts >= min_count]
+        return Counter(dict(zip(counts.index, counts.tolist())))
+
+
+def _iter_ngram_counts(texts, n, exclude, min_length, chunk_rows, workers):
+    """分块统计n元词组，每块返回(词组数组, 块内精确计数)"""
+    exclude = list(exclude)
+    for start in range(0, len(texts), chunk_rows):
+        rows, codes, terms = tokenize_batch(texts.iloc[start:start + chunk_rows], workers)
+        if len(codes) < n:
+            continue
+
+        # 只保留同一条评论内、且每个词都有效的连续n个词
+        lengths = np.fromiter((len(term) for term in terms), dtype=np.int64, count=len(terms))
+        valid = (lengths >= min_length) & ~pd.Index(terms).isin(exclude)
+        valid = valid[codes]
+        window = len(codes) - n + 1
+        keep = rows[:window] == rows[n - 1:]
+        for k in range(n):
+            keep &= valid[k:window + k]
+        positions = np.flatnonzero(keep)
+        if not len(positions):
+            continue
+
+        vocab_size = len(terms)
+        if vocab_size ** n < 2 ** 63:
+            # 把n个词编号合并为一个整数后计数，比按行去重快得多
+            gram_ids = np.zeros(len(positions), dtype=np.int64)
+            for k in range(n):
+                gram_ids = gram_ids * vocab_size + codes[positions + k]
+            unique_ids, counts = np.unique(gram_ids, return_counts=True)
+            unique_grams = np.empty((len(unique_ids), n), dtype=np.int64)
+            for k in range(n - 1, -1, -1):
+                unique_ids, unique_grams[:, k] = np.divmod(unique_ids, vocab_size)
+        else:
+            grams = np.stack([codes[positions + k] for k in range(n)], axis=1)
+            unique_grams, counts = np.unique(grams, axis=0, return_counts=True)
+        phrases = terms[unique_grams[:, 0]]
+        for k in range(1, n):
+            phrases = phrases + ' ' + terms[unique_grams[:, k]]
+        yield phrases, counts
+
+
+@instrument()
+def count_ngrams(texts, n=2, exclude=(), min_length=1, min_count=2,
+                 max_entries=NGRAM_MAX_ENTRIES, chunk_rows=50000, workers=1):
+    """统计n元词组（连续n个词，n=1时为单词）的出现次数
+
+    分块分词，每块内用词编号的n元组计数，只把块内去重后的词组转换为字符串，
+    再合并到Space-Saving统计中。任一词在exclude中或长度小于min_length的词组不计入。
+    max_entries限制保留的词组数量，内存占用与语料大小和词表大小无关；超出后低频词组
+    的计数是近似值，高频词组基本不受影响。max_entries为None时结果精确。
+    返回出现次数不少于min_count的词组Counter。
+    """
+    summary = SpaceSaving(max_entries)
+    for phrases, counts in _iter_ngram_counts(texts, n, exclude, min_length, chunk_rows, workers):
+        summary.update(phrases, counts)
+    return summary.to_counter(min_count)
+
+
+def stem_words(words):
+    """对词列表做词干提取（Porter算法）"""
+    from nltk.stem import PorterStemmer
+
+    stemmer = PorterStemmer()
+    return [stemmer.stem(word) for word in words]
+
+
+def load_stop_words():
+    """加载停用词"""
+    # 基础英文停用词
+    stop_words = {
+        # 人称代词
+        'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're",
+        "you've", "you'll", "you'd", 'your', 'yours', 'yourself', 'yourselves',
+        'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers', 'herself',
+        'it', "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
+        
+        # 疑问词和指示词
+        'what', 'which', 'who', 'whom', 'this', 'that', "that'll", 'these', 'those',
+        'where', 'when', 'why', 'how', 'whose',
+        
+        # 常见动词和助动词
+        'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
+        'had', 'having', 'do', 'does', 'did', 'doing', 'will', 'would', 'shall',
+        'should', 'can', 'could', 'may', 'might', 'must', 'ought', 'need', 'dare',
+        
+        # 介词和连词
+        'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while',
+        'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into',
+        'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from',
+        'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further',
+        'then', 'once', 'here', 'there', 'all', 'any', 'both', 'each',
+        
+        # 常见副词和形容词
+        'just', 'now', 'only', 'very', 'really', 'quite', 'rather', 'somewhat',
+        'more', 'most', 'much', 'many', 'some', 'such', 'no', 'nor', 'not',
+        'too', 'very', 'same', 'different', 'other', 'another', 'like', 'unlike',
+        
+        # 时间相关词
+        'today', 'tomorrow', 'yesterday', 'now', 'later', 'earlier', 'soon',
+        'already', 'yet', 'still', 'always', 'never', 'ever', 'often', 'sometimes',
+        
+        # 数量词和序数词
+        'one', 'two', 'three', 'first', 'second', 'third', 'next', 'last',
+        'few', 'several', 'many', 'much', 'more', 'most', 'own', 'every',
+        
+        # 其他常见词
+        'yes', 'no', 'maybe', 'ok', 'okay', 'right', 'wrong', 'well', 'anyway',
+        'however', 'although', 'though', 'despite', 'unless', 'whereas',
+        'whether', 'whatever', 'whoever', 'whenever', 'wherever', 'however',
+        
+        # 网络用语和缩写
+        'lol', 'omg', 'idk', 'tbh', 'imo', 'imho', 'fyi', 'asap', 'aka'
+    }
+    
+    # 添加一些自定义停用词（与产品评论相关）
+    custom_stop_words = {
+        # 产品相关
+        'amazon', 'product', 'item', 'purchase', 'bought', 'buy', 'seller',
+        'shipping', 'delivery', 'arrived', 'ordered', 'received', 'return',
+        'customer', 'service', 'price', 'worth', 'money', 'paid', 'cost',
+        
+        # 评论常用词
+        'would', 'could', 'get', 'use', 'using', 'used', 'recommend',
+        'recommended', 'definitely', 'probably', 'maybe', 'think', 'thought',
+        'seems', 'looked', 'looks', 'looking', 'came', 'come', 'goes', 'going',
+        'got', 'getting', 'make', 'makes', 'made', 'making',
+        
+        # 时间和状态
+        'day', 'days', 'week', 'weeks', 'month', 'months', 'year', 'years',
+        'time', 'times', 'ago', 'since', 'far', 'long', 'short',
+        
+        # 评分相关
+        'star', 'stars', 'rating', 'rated', 'review', 'reviews', 'reviewed'
+    }
+    
+    return stop_words.union(custom_stop_words)
+
+
+def load_negative_words():
+    """从文件加载否定词列表"""
+    if os.path.exists('negative_words.json'):
+        with open('negative_words.json', 'r') as f:
+            return set(json.load(f))
+    return set()
+
+
+def save_negative_words(words):
+    """保存否定词列表到文件"""
+    with open('negative_words.json', 'w') as f:
+        json.dump(list(words), f)
+
+
+def parse_keywords(keywords):
+    """将逗号分隔的关键词字符串解析为去重后的小写关键词列表，忽略空关键词"""
+    parsed = []
+    for keyword in str(keywords or '').split(','):
+        keyword = keyword.strip().lower()
+        if keyword and keyword not in parsed:
+            parsed.append(keyword)
+    return parsed
+
+
+def _escape_literal(word):
+    """转义关键词中的正则特殊字符"""
+    return ''.join('\\' + char if char in REGEX_SPECIAL_CHARS else char for char in word)
+
+
+def compile_category_patterns(categories):
+    """将每个类别的关键词合并为一个正则表达式，没有关键词的类别为None"""
+    patterns = {}
+    for category, keywords in categories.items():
+        words = parse_keywords(keywords)
+        patterns[category] = '|'.join(_escape_literal(word) for word in words) if words else None
+    return patterns
+
+
+def keywords_hash(words):
+    """计算关键词集合的哈希值，关键词顺序和空白不影响结果"""
+    return hashlib.sha1('\x1f'.join(sorted(words)).encode('utf-8')).hexdigest()
+
+
+def normalize_categories(categories):
+    """将类别转换为{类别: 关键词哈希}，用于判断关键词是否真正发生变化"""
+    return {category: keywords_hash(parse_keywords(keywords)) for category, keywords in categories.items()}
+
+
+class CategoryMatcher:
+    """按类别缓存编译结果的关键词匹配器
+
+    每个类别以关键词集合的哈希值作为版本，只有关键词集合变化的类别才会重新编译。
+    """
+
+    def __init__(self, workers=TEXT_WORKERS):
+        self.workers = workers
+        self.patterns = {}
+        self.hashes = {}
+        self.version = keywords_hash([])
+        # 上一次的匹配结果：每行文本的哈希、每个类别的匹配列及计算时的关键词哈希
+        self._data_key = None
+        self._row_hashes = np.empty(0, dtype=np.uint64)
+        self._columns = {}
+        self._column_hashes = {}
+
+    def update(self, categories):
+        """同步类别和关键词，返回重新编译的类别列表"""
+        changed = []
+        hashes = normalize_categories(categories)
+        for category, digest in hashes.items():
+            if self.hashes.get(category) != digest:
+                self.patterns[category] = compile_category_patterns({category: categories[category]})[category]
+                changed.append(category)
+        # 移除已删除的类别，并保持与categories相同的类别顺序
+        self.patterns = {category: self.patterns[category] for category in hashes}
+        self.hashes = hashes
+        self.version = keywords_hash(f"{category}={digest}" for category, digest in hashes.items())
+        return changed
+
+    @instrument()
+    def match(self, texts, data_key=None):
+        """计算所有类别的匹配矩阵，复用上一次的结果
+
+        关键词没有变化的类别直接复用上一次的匹配列；如果texts是在上一次文本之后
+        追加了新行，这些类别只计算新增的行。data_key为数据集标识（如文件内容哈希），
+        与上一次相同时跳过逐行哈希比较。
+        """
+        n_cached = len(self._row_hashes)
+        if data_key is not None and data_key == self._data_key and len(texts) == n_cached:
+            row_hashes = self._row_hashes
+            n_reused = n_cached
+        else:
+            row_hashes = pd.util.hash_pandas_object(texts, index=False).to_numpy()
+            if 0 < n_cached <= len(row_hashes) and np.array_equal(row_hashes[:n_cached], self._row_hashes):
+                n_reused = n_cached
+            else:
+                n_reused = 0
+
+        reusable = [
+            category for category in self.patterns
+            if n_reused and self._column_hashes.get(category) == self.hashes[category]
+        ]
+        stale = [category for category in self.patterns if category not in reusable]
+
+        columns = {}
+        if stale:
+            columns.update(match_texts(texts, {category: self.patterns[category] for category in stale}, self.workers))
+        if reusable:
+            # 没有追加新行时直接复用，不再转换和分片文本
+            if n_reused < len(texts):
+                appended = match_texts(
+                    texts.iloc[n_reused:],
+                    {category: self.patterns[category] for category in reusable},
+                    self.workers
+                )
+            else:
+                appended = {category: np.zeros(0, dtype=bool) for category in reusable}
+            for category in reusable:
+                columns[category] = np.concatenate([self._columns[category][:n_reused], appended[category]])
+
+        self._data_key = data_key
+        self._row_hashes = row_hashes
+        self._columns = columns
+        self._column_hashes = dict(self.hashes)
+        return pd.DataFrame(columns, index=texts.index, columns=list(self.patterns))
+
+
+def to_string_arrow(texts):
+    """将文本列转换为Arrow字符串数组，空值保留为null"""
+    if isinstance(texts.dtype, pd.StringDtype) and texts.dtype.storage == 'pyarrow':
+        # 已经是Arrow字符串列时直接取出底层数组
+        return texts.array.__arrow_array__().combine_chunks().cast(pa.string())
+    try:
+        return pa.array(texts, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(texts.where(texts.isna(), texts.astype(str)), type=pa.string(), from_pandas=True)
+
+
+def match_lowered(lowered, patterns):
+    """在已转换为小写的Arrow字符串数组上匹配各类别，返回{类别: 布尔数组}"""
+    matrix = {}
+    for category, pattern in patterns.items():
+        if pattern is None:
+            matrix[category] = np.zeros(len(lowered), dtype=bool)
+        else:
+            matched = pc.match_substring_regex(lowered, pattern=pattern)
+            matrix[category] = pc.fill_null(matched, False).to_numpy(zero_copy_only=False)
+    return matrix
+
+
+def _match_array(array, patterns):
+    """在Arrow字符串数组上匹配各类别"""
+    return match_lowered(pc.utf8_lower(array), patterns)
+
+
+def match_texts(texts, patterns, workers=1):
+    """匹配各类别，返回{类别: 布尔数组}，workers大于1且数据量足够时分片并行"""
+    sharded = _map_shards(_match_array, texts, workers, patterns)
+    if sharded is None:
+        return _match_array(to_string_arrow(texts), patterns)
+    _, results = sharded
+    return {category: np.concatenate([result[category] for result in results]) for category in patterns}
+
+
+@instrument()
+def match_categories(texts, patterns, workers=1):
+    """一次性计算所有类别的匹配矩阵（子串匹配，不区分大小写）
+
+    文本只转换一次小写，每个类别的全部关键词由RE2编译为一个自动机，
+    每条文本只扫描一遍。返回以类别为列、与texts同索引的布尔DataFrame。
+    """
+    matrix = match_texts(texts, patterns, workers)
+    return pd.DataFrame(matrix, index=texts.index, columns=list(patterns))
+
+
+class TokenIndex:
+    """评论文本的倒排索引：词 → 包含该词的行号及词频
+
+    每条评论只分词一次，倒排表以CSR形式存储（indptr + rows + counts），
+    类别匹配通过倒排表的交集/并集完成，词频统计只需对倒排表求和，不再逐行扫描文本。
+    stem为True时词和关键词都先做词干提取，size/sizes等变体可以互相匹配。
+    """
+
+    def __init__(self, terms, indptr, rows, counts, ids, stem=False):
+        self.terms = np.asarray(terms, dtype=object)
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.indptr = indptr
+        self.rows = rows
+        self.counts = counts
+        self.ids = ids
+        self.n_rows = len(ids)
+        self.stem = stem
+        # 倒排表即文档-词矩阵的CSC形式，直接共享数组
+        self.matrix = sp.csc_matrix((counts, rows, indptr), shape=(self.n_rows, len(self.terms)))
+
+    @classmethod
+    @instrument()
+    def build(cls, texts, ids=None, stem=False, workers=1):
+        """从文本列构建倒排索引，ids为每行对应的评论ID（默认为行号+1）"""
+        n_rows = len(texts)
+        row_ids, codes, terms = tokenize_batch(texts, workers)
+        if stem:
+            stem_codes, terms = pd.factorize(np.array(stem_words(terms), dtype=object))
+            codes = stem_codes[codes]
+
+        # 按(词, 行)聚合词频并排序，得到每个词的有序行号列表
+        width = max(n_rows, 1)
+        pairs, counts = np.unique(codes.astype(np.int64) * width + row_ids, return_counts=True)
+        indptr = np.searchsorted(pairs // width, np.arange(len(terms) + 1))
+        rows = (pairs % width).astype(np.int64)
+
+        if ids is None:
+            ids = np.arange(1, n_rows + 1)
+        return cls(terms, indptr, rows, counts.astype(np.int32), np.asarray(ids, dtype=np.int64), stem=stem)
+
+    def save(self, path):
+        """保存索引，倒排表按差值编码后压缩"""
+        deltas = np.diff(self.rows, prepend=0)
+        # 每个词倒排表的第一项保存原始行号
+        starts = self.indptr[:-1][np.diff(self.indptr) > 0]
+        deltas[starts] = self.rows[starts]
+        # 词表保存为连续的UTF-8字节和偏移量，不转换为按最长词定宽的numpy字符串数组
+        terms = pa.array(self.terms, type=pa.large_string())
+        term_offsets = np.frombuffer(terms.buffers()[1], dtype=np.int64)[:len(terms) + 1]
+        data = terms.buffers()[2]
+        term_data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.empty(0, dtype=np.uint8)
+        # 以.npz结尾，否则np.savez_compressed会自动追加扩展名
+        tmp_path = temp_path(path, suffix='.tmp.npz')
+        try:
+            np.savez_compressed(
+            tmp_path,
+                term_offsets=term_offsets,
+                term_data=term_data[:term_offsets[-1]],
+                indptr=self.indptr,
+                deltas=deltas.astype(np.uint32),
+                counts=self.counts,
+                ids=self.ids,
+                stem=np.array(self.stem)
+            )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        """读取保存的索引"""
+        with np.load(path, allow_pickle=False) as data:
+            indptr = data['indptr']
+            deltas = data['deltas'].astype(np.int64)
+            # 按倒排表分段累加还原行号
+            rows = np.cumsum(deltas)
+            starts = indptr[:-1][np.diff(indptr) > 0]
+            offsets = np.zeros(len(rows), dtype=np.int64)
+            offsets[starts] = rows[starts] - deltas[starts]
+            rows = rows - np.maximum.accumulate(offsets)
+            term_offsets = data['term_offsets']
+            terms = pa.LargeStringArray.from_buffers(
+                len(term_offsets) - 1, pa.py_buffer(term_offsets), pa.py_buffer(data['term_data'])
+            ).to_numpy(zero_copy_only=False)
+            return cls(terms, indptr, rows,
+                       data['counts'], data['ids'], stem=bool(data['stem']))
+
+    def postings(self, term):
+        """返回包含该词的行号数组"""
+        code = self.vocabulary.get(term)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.rows[self.indptr[code]:self.indptr[code + 1]]
+
+    def posting_ids(self, term):
+        """返回包含该词的评论ID数组"""
+        return self.ids[self.postings(term)]
+
+    def keyword_rows(self, keyword, texts=None):
+        """返回匹配关键词的行号
+
+        多词关键词先取各词倒排表的交集作为候选行，提供texts（与索引行对齐的文本列）时
+        再检查这些词在候选行中是否按顺序相邻出现，texts为None时只取交集。
+        """
+        terms = tokenize(keyword)
+        if self.stem:
+            terms = stem_words(terms)
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+        rows = self.postings(terms[0])
+        for term in terms[1:]:
+            rows = np.intersect1d(rows, self.postings(term), assume_unique=True)
+        if texts is not None and len(terms) > 1:
+            rows = self._phrase_rows(rows, terms, texts)
+        return rows
+
+    def _phrase_rows(self, rows, terms, texts):
+        """只保留terms按顺序相邻出现的候选行，只对候选行重新分词"""
+        if not len(rows):
+            return rows
+        token_rows, codes, vocabulary = tokenize_batch(texts.iloc[rows])
+        if self.stem:
+            vocabulary = np.array(stem_words(vocabulary), dtype=object)
+        k = len(terms)
+        starts = np.arange(max(len(codes) - k + 1, 0))
+        # 从starts开始的k个词属于同一行，且依次等于关键词的各个词
+        matched = token_rows[starts] == token_rows[starts + k - 1]
+        for offset, term in enumerate(terms):
+            matched &= (vocabulary == term)[codes[starts + offset]]
+        return rows[np.unique(token_rows[starts[matched]])]
+
+    def match_categories(self, categories, texts):
+        """计算所有类别的整词匹配矩阵，每个类别为其关键词结果的并集
+
+        texts为与索引行对齐的文本列，用于检查多词关键词是否作为短语出现。
+        """
+        matrix = {}
+        for category, keywords in categories.items():
+            mask = np.zeros(self.n_rows, dtype=bool)
+            for keyword in parse_keywords(keywords):
+                mask[self.keyword_rows(keyword, texts)] = True
+            matrix[category] = mask
+        return pd.DataFrame(matrix, columns=list(categories))
+
+    def term_totals(self, row_mask=None):
+        """统计每个词的出现次数，返回与self.terms对齐的数组，row_mask为布尔数组时只统计选中的行"""
+        # 词频为文档-词矩阵按选中行的列求和
+        if row_mask is None:
+            weights = np.ones(self.n_rows, dtype=np.int64)
+        else:
+            weights = np.asarray(row_mask, dtype=np.int64)
+        return np.asarray(self.matrix.T @ weights).ravel()
+
+    def term_totals_by_group(self, labels):
+        """按分组统计词频，返回{分组: 与self.terms对齐的词频数组}"""
+        codes, groups = pd.factorize(np.asarray(labels), use_na_sentinel=False)
+        indicator = sp.csr_matrix(
+            (np.ones(self.n_rows, dtype=np.int64), (codes, np.arange(self.n_rows))),
+            shape=(len(groups), self.n_rows)
+        )
+        totals = (indicator @ self.matrix).toarray()
+        return {group: totals[i] for i, group in enumerate(groups)}
+
+    def term_mask(self, exclude=(), min_length=1):
+        """词表过滤掩码，exclude中的词和长度小于min_length的词为False"""
+        lengths = np.fromiter((len(term) for term in self.terms), dtype=np.int64, count=len(self.terms))
+        keep = lengths >= min_length
+        if exclude:
+            keep &= ~pd.Index(self.terms).isin(list(exclude))
+        return keep
+
+    def to_counter(self, totals, keep=None):
+        """将词频数组转换为Counter，只保留出现过且keep为True的词"""
+        selected = totals > 0
+        if keep is not None:
+            selected &= keep
+        return Counter(dict(zip(self.terms[selected], totals[selected].tolist())))
+
+    def term_frequencies(self, row_mask=None, exclude=(), min_length=1):
+        """统计词频，row_mask为布尔数组时只统计选中的行
+
+        exclude中的词和长度小于min_length的词不计入结果。
+        """
+        return self.to_counter(self.term_totals(row_mask), self.term_mask(exclude, min_length))
+
+
+# 最近使用的倒排索引，按数据缓存键保存在内存中；所有会话共享，读写时需持有_INDEX_LOCK
+_INDEX_CACHE = OrderedDict()
+_INDEX_CACHE_SIZE = 4
+_INDEX_LOCK = threading.Lock()
+
+
+@instrument()
+def load_token_index(df, stem=False):
+    """获取df的倒排索引
+
+    依次查找内存缓存和磁盘缓存，都没有时构建索引并保存。
+    数据不是从缓存读取的（没有store_key）时只构建不保存。
+    """
+    store_key = df.attrs.get('store_key')
+    ids = df['ID'].to_numpy() if 'ID' in df.columns else None
+    if store_key is None:
+        return TokenIndex.build(df['Content'], ids=ids, stem=stem, workers=TEXT_WORKERS)
+
+    key = f"{store_key}-index{'-stem' if stem else ''}"
+    with _INDEX_LOCK:
+        index = _INDEX_CACHE.get(key)
+    if index is None:
+        # 读取或构建索引时不持有锁，不阻塞其他会话
+        path = store_path(key, ext='npz')
+        if os.path.exists(path):
+            index = TokenIndex.load(path)
+        else:
+            index = TokenIndex.build(df['Content'], ids=ids, stem=stem, workers=TEXT_WORKERS)
+            os.makedirs(STORE_DIR, exist_ok=True)
+            index.save(path)
+    with _INDEX_LOCK:
+        _INDEX_CACHE[key] = index
+        _INDEX_CACHE.move_to_end(key)
+        while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return index
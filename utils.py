@@ -1,11 +1,62 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import os
 import plotly.express as px
 import plotly.graph_objects as go
-import io
+from export import export_bytes, to_excel_bytes
+from data_store import STRING_DTYPE, load_from_store, load_reviews, store_path
+from profiling import instrument
 
-def process_data(df):
-    """数据预处理函数"""
+# 评论类型的固定分类顺序
+REVIEW_TYPES = ['positive', 'neutral', 'negative', 'unknown']
+
+# 趋势图默认最多显示的分组数，其余合并为"其他"
+MAX_TREND_GROUPS = 20
+
+# 热力图每页显示的行数
+HEATMAP_PAGE_SIZE = 50
+
+# 数据点超过该数量时使用WebGL绘制折线图
+WEBGL_THRESHOLD = 1000
+
+def classify_review_type(rating):
+    """根据评分向量化计算评论类型：4-5为positive，3为neutral，其余为negative，无评分为unknown"""
+    rating = pd.to_numeric(rating, errors='coerce')
+    codes = np.select(
+        [rating >= 4, rating == 3, rating.notna()],
+        [0, 1, 2],
+        default=3
+    ).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=REVIEW_TYPES)
+
+def to_stripped_category(series):
+    """将列转换为去除首尾空白的分类类型，只对去重后的值做字符串处理"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    labels = pd.Index(uniques).astype(str).str.strip()
+    label_codes, categories = pd.factorize(labels, sort=True)
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+def combine_categories(first, second, sep=' - '):
+    """两列组合为一个分类列，例如Asin-Model组合
+
+    按两列的分类编号对去重，只为出现过的组合拼接一次字符串，不逐行拼接。
+    """
+    codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([first, second]), sort=True)
+    labels = pd.Index([f"{a}{sep}{b}" for a, b in pairs])
+    label_codes, categories = pd.factorize(labels, sort=True)
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+def compact_rating(rating):
+    """将评分转换为紧凑的数值类型，全部为整数时使用int8"""
+    rating = pd.to_numeric(rating, errors='coerce')
+    if rating.notna().all() and (rating % 1 == 0).all():
+        return rating.astype(np.int8)
+    return rating.astype(np.float32)
+
+@instrument()
+def process_data(df, id_start=1):
+    """数据预处理函数，id_start为ID列的起始编号（分块处理时使用）"""
     # 确保所需列存在
     required_columns = ['Asin', 'Title', 'Content', 'Model', 'Rating', 'Date']
     for col in required_columns:
@@ -18,34 +69,25 @@ def process_data(df):
     df = df[required_columns].copy()
     
     # 2. 清理数据
-    # 处理Rating列，确保为数值类型
-    df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
+    # 处理Rating列，确保为紧凑的数值类型
+    df['Rating'] = compact_rating(df['Rating'])
     
     # 处理日期列，确保为日期类型
     df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
     
-    # 清理文本列中的空白字符
-    text_columns = ['Title', 'Content', 'Model']
-    for col in text_columns:
-        df[col] = df[col].astype(str).str.strip()
+    # 清理文本列中的空白字符，使用Arrow字符串存储，空值保留为缺失值
+    for col in ['Title', 'Content']:
+        df[col] = df[col].astype(STRING_DTYPE).str.strip()
+    
+    # Asin和Model重复值多，转换为分类类型
+    for col in ['Asin', 'Model']:
+        df[col] = to_stripped_category(df[col])
     
     # 3. 添加ID列
-    df.insert(0, 'ID', range(1, len(df) + 1))
+    df.insert(0, 'ID', np.arange(id_start, id_start + len(df)))
     
     # 4. 添加Review Type列
-    def get_review_type(rating):
-        try:
-            rating = float(rating)
-            if rating >= 4:
-                return 'positive'
-            elif rating == 3:
-                return 'neutral'
-            else:
-                return 'negative'
-        except:
-            return 'unknown'
-    
-    df['Review Type'] = df['Rating'].apply(get_review_type)
+    df['Review Type'] = classify_review_type(df['Rating'])
     
     # 5. 重新排序列
     column_order = ['ID', 'Asin', 'Title', 'Content', 'Model', 'Rating', 'Date', 'Review Type']
@@ -53,10 +95,51 @@ def process_data(df):
     
     return df
 
+def set_session_dataset(df):
+    """记录当前会话分析的数据集，各页面共用；会话中只保存缓存键，数据本身在进程内共享"""
+    set_session_dataset_key(df.attrs.get('store_key'))
+
+def set_session_dataset_key(key):
+    """按缓存键记录当前会话的数据集，不需要读取数据"""
+    st.session_state.dataset_key = key
+
+def has_session_dataset():
+    """当前会话是否有可用的已处理数据"""
+    key = st.session_state.get('dataset_key')
+    return key is not None and os.path.exists(store_path(key))
+
+def get_session_dataset():
+    """获取当前会话的数据集，没有时返回None"""
+    key = st.session_state.get('dataset_key')
+    return load_from_store(key) if key is not None else None
+
+def load_page_dataset(uploaded_file):
+    """获取页面要分析的数据：上传了文件时读取上传的文件，否则使用首页处理后的数据"""
+    if uploaded_file is not None:
+        df = load_reviews(uploaded_file)
+        set_session_dataset(df)
+        return df
+    df = get_session_dataset()
+    if df is not None:
+        st.info(f"正在使用已处理的数据（{len(df)}条评论），如需分析其他文件请上传")
+    return df
+
+def memory_report(df):
+    """每列的数据类型和实际内存占用"""
+    usage = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({
+        '类型': df.dtypes.astype(str),
+        '内存(MB)': (usage / 2 ** 20).round(2),
+        '占比(%)': (usage / max(usage.sum(), 1) * 100).round(1)
+    })
+    report.index.name = '列名'
+    return report
+
 def calculate_review_stats(df):
     """计算评论类型的统计信息"""
     # 计算各类型数量
     review_counts = df['Review Type'].value_counts()
+    review_counts = review_counts[review_counts > 0]
     
     # 计算百分比
     review_percentages = (review_counts / len(df) * 100).round(2)
@@ -85,49 +168,102 @@ def create_pie_chart(review_counts, title='评论类型分布'):
     fig.update_traces(textposition='inside', textinfo='percent+label')
     return fig
 
+@instrument()
+def aggregate_by_group(df, key='Asin'):
+    """单次遍历计算每组的评论数量、平均评分、标准差、评论类型分布和评分分布
+
+    分组键先编码为整数，之后全部用bincount完成，不对每个分组调用Python函数。
+    返回(统计表, 评分分布计数表)，行的顺序与groupby(sort=True, observed=True)一致。
+    """
+    codes, groups = pd.factorize(df[key], sort=True)
+    n_groups = len(groups)
+    has_group = codes >= 0
+    codes = codes[has_group]
+    index = pd.Index(groups, name=key)
+
+    # 评分的数量、均值和标准差（先求均值再求离差平方和，避免大数相减的精度损失）
+    rating = pd.to_numeric(df['Rating'], errors='coerce').to_numpy(dtype=np.float64)[has_group]
+    rated = ~np.isnan(rating)
+    rated_codes, rated_values = codes[rated], rating[rated]
+    count = np.bincount(rated_codes, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(rated_codes, weights=rated_values, minlength=n_groups) / count
+        squares = np.bincount(rated_codes, weights=(rated_values - mean[rated_codes]) ** 2,
+                              minlength=n_groups)
+        std = np.sqrt(squares / (count - 1))
+    std[count < 2] = np.nan
+
+    # 评论类型分布：按数量从多到少排列，省略数量为0的类型
+    type_codes, types = pd.factorize(df['Review Type'], sort=True)
+    type_codes = type_codes[has_group]
+    typed = type_codes >= 0
+    type_counts = np.bincount(codes[typed] * len(types) + type_codes[typed],
+                              minlength=n_groups * len(types)).reshape(n_groups, len(types))
+    order = np.argsort(-type_counts, axis=1, kind='stable')
+    type_labels = np.asarray(types, dtype=object)
+    distributions = [
+        {type_labels[j]: int(row[j]) for j in row_order if row[j] > 0}
+        for row, row_order in zip(type_counts, order)
+    ]
+
+    stats = pd.DataFrame({
+        '评论数量': count,
+        '平均评分': mean,
+        '标准差': std,
+    }, index=index).round(2)
+    stats['评论类型分布'] = distributions
+
+    # 评分分布：组编号×评分编号的二维计数
+    rating_codes, ratings = pd.factorize(rated_values, sort=True)
+    histogram = np.bincount(rated_codes * len(ratings) + rating_codes,
+                            minlength=n_groups * len(ratings)).reshape(n_groups, len(ratings))
+    rating_dist = pd.DataFrame(histogram, index=index,
+                               columns=pd.Index(ratings, name='Rating'))
+    rating_dist = rating_dist[count > 0]
+
+    return stats, rating_dist
+
+@instrument()
 def analyze_by_group(df, group_by):
     """按指定字段进行分组分析"""
     # 始终计算ASIN维度的统计信息
-    asin_stats = df.groupby('Asin').agg({
-        'Rating': ['count', 'mean', 'std'],
-        'Review Type': lambda x: x.value_counts().to_dict()
-    }).round(2)
-    
-    # 重命名列
-    asin_stats.columns = ['评论数量', '平均评分', '标准差', '评论类型分布']
+    asin_stats, rating_dist = aggregate_by_group(df, 'Asin')
     
     # 计算ASIN的评分分布
-    rating_dist = df.groupby(['Asin', 'Rating']).size().unstack(fill_value=0)
     rating_dist_pct = rating_dist.div(rating_dist.sum(axis=1), axis=0) * 100
     
-    # 如果是Asin+Model分析，创建组合数据用于时间趋势图
-    if isinstance(group_by, list):
-        df['Group'] = df['Asin'] + ' - ' + df['Model']
-        group_by_trend = 'Group'
-    else:
-        group_by_trend = 'Asin'
+    # 如果是Asin+Model分析，时间趋势图按Asin-Model组合分组
+    group_by_trend = 'Group' if isinstance(group_by, list) else 'Asin'
     
     return asin_stats, rating_dist_pct, group_by_trend
 
-def create_rating_trend_chart(df, group_by):
-    """创建评分趋势图"""
-    # 按时间和分组计算平均评分
-    df['Month'] = df['Date'].dt.to_period('M').astype(str)
-    trend_data = df.groupby(['Month', group_by])['Rating'].mean().reset_index()
-    
+def line_render_mode(trend_data):
+    """数据点较多时使用WebGL（Scattergl）绘制，避免浏览器卡顿"""
+    return 'webgl' if len(trend_data) > WEBGL_THRESHOLD else 'auto'
+
+@instrument()
+def create_rating_trend_chart(trend_data, group_by):
+    """创建评分趋势图，trend_data为rollup.rating_trend按分组计算的平均评分"""
     # 创建趋势图
     title = 'Asin-Model组合随时间的平均评分变化' if group_by == 'Group' else 'Asin随时间的平均评分变化'
     
     fig = px.line(trend_data, 
-                  x='Month', 
+                  x='Period', 
                   y='Rating', 
                   color=group_by,
                   title=title,
-                  labels={'Rating': '平均评分', 'Month': '月份'})
+                  labels={'Rating': '平均评分', 'Period': '时间'},
+                  render_mode=line_render_mode(trend_data))
     
     fig.update_xaxes(tickangle=45)
     return fig
 
+def rank_heatmap_rows(rating_dist_pct, review_counts):
+    """按评论数量从多到少排列热力图的行，便于分页查看"""
+    order = review_counts.reindex(rating_dist_pct.index).sort_values(ascending=False, kind='stable').index
+    return rating_dist_pct.loc[order]
+
+@instrument()
 def create_rating_heatmap(rating_dist_pct, title):
     """创建评分分布热力图"""
     fig = go.Figure(data=go.Heatmap(
@@ -148,17 +284,18 @@ def create_rating_heatmap(rating_dist_pct, title):
     
     return fig
 
+def figure_payload_size(fig):
+    """图表发送到浏览器的JSON数据大小（字节）"""
+    return len(fig.to_json().encode('utf-8'))
+
 def save_fig_to_html(fig, filename):
     """保存图表为HTML文件"""
     return fig.to_html()
 
+@instrument()
 def get_download_data(df, file_format='excel'):
     """准备下载数据"""
     if file_format == 'excel':
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
-        data = output.getvalue()
-        return data
+        return to_excel_bytes(df)
     else:  # txt format
-        return df.to_string(index=False) 
\ No newline at end of file
+        return export_bytes(df, 'TXT').decode('utf-8') 
\ No newline at end of file